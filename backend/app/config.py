@@ -1,9 +1,12 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     AMADEUS_CLIENT_ID: str
     AMADEUS_CLIENT_SECRET: str
     AMADEUS_HOSTNAME: str = "test"
+    AMADEUS_SEARCH_ENABLED: bool = False  # true = SerpApiと並行してAmadeusでも検索
     
     SERPAPI_KEY: str
     
@@ -22,7 +25,14 @@ class Settings(BaseSettings):
     # Web Scraper Settings
     SCRAPER_HEADLESS: bool = False  # false = ブラウザ表示, true = 非表示
     SCRAPER_AUTO_CLOSE: bool = True  # true = 自動閉じる, false = 開いたまま
+    SCRAPER_BROWSER_POOL_SIZE: int = 4  # 同時に起動しておくブラウザ数 (ANA/ENA共通)
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Return the process-wide Settings instance.
+    .env is parsed and validated once, on first access, instead of at import time.
+    """
+    return Settings()
@@ -1,17 +1,44 @@
+import asyncio
+from typing import AsyncIterator
 import google.generativeai as genai
-from openai import OpenAI
-from app.config import settings
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from app.config import get_settings
 from app.models import Offer
+from app.core.cache import SimpleCache
+from app.core.ranking import score_breakdown
+from app.core import prompts
+import hashlib
 import logging
+import orjson
+import re
 
 logger = logging.getLogger(__name__)
 
+# Explanations for identical prompts are reused for an hour
+EXPLAIN_CACHE_TTL = 3600
+_explain_cache = SimpleCache(maxsize=2048)
+
+# HTML sent to the model for extraction / selector repair
+MAX_HTML_CHARS = 20000
+_NOISE_BLOCK_RE = re.compile(r'<(script|style|noscript|svg|iframe|template)\b.*?</\1\s*>|<!--.*?-->', re.S | re.I)
+_NOISE_ATTR_RE = re.compile(r'\s(?:style|srcset|on[a-z]+)="[^"]*"|\s(?:src|href)="data:[^"]*"', re.I)
+_WHITESPACE_RE = re.compile(r'\s{2,}')
+# Leading ```json / ``` and trailing ``` around model JSON output
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+_BODY_RE = re.compile(r'<body\b.*?>(.*)</body\s*>', re.S | re.I)
+
 # Initialize Clients
 gemini_model = None
-openai_client = None
+openai_client = None  # AsyncOpenAI, used from the FastAPI handlers
+openai_sync_client = None  # OpenAI, used from the scraper threads (AI fallback)
+
+OPENAI_MODEL = "gpt-4o-mini"
+OPENAI_SYSTEM_PROMPT = "You are a helpful travel assistant. Reply in Japanese."
 
 def init_ai():
-    global gemini_model, openai_client
+    global gemini_model, openai_client, openai_sync_client
+    settings = get_settings()
     
     # 1. Gemini Init
     if settings.GOOGLE_API_KEY:
@@ -21,226 +48,303 @@ def init_ai():
             # Try 'gemini-1.5-flash' first, but if error 404 seen, use 'gemini-pro'
             gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest') 
         except Exception as e:
-            logger.warning(f"Gemini Init Warning: {e}")
+            logger.warning("Gemini Init Warning: %s", e)
     
     # 2. OpenAI Init
     if settings.OPENAI_API_KEY:
         try:
-            openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            # One pooled keep-alive client for all requests (no TLS handshake per call)
+            openai_client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_keepalive_connections=16, max_connections=32),
+                    timeout=30.0
+                )
+            )
+            openai_sync_client = OpenAI(api_key=settings.OPENAI_API_KEY)
         except Exception as e:
-            logger.warning(f"OpenAI Init Warning: {e}")
+            logger.warning("OpenAI Init Warning: %s", e)
 
 # Call init on module load
 init_ai()
 
-def explain_with_openai(prompt: str) -> dict:
+def _openai_request(prompt: str) -> dict:
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 300,
+        "temperature": 0
+    }
+
+def _openai_usage(usage) -> dict:
+    # Cost Calc (GPT-4o-mini approx prices)
+    # Input: $0.15 / 1M tokens, Output: $0.60 / 1M tokens
+    # 1 USD = 150 JPY
+    input_cost_usd = (usage.prompt_tokens / 1_000_000) * 0.15
+    output_cost_usd = (usage.completion_tokens / 1_000_000) * 0.60
+    total_jpy = (input_cost_usd + output_cost_usd) * 150
+    
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+        "cost_jpy": round(total_jpy, 4)
+    }
+
+def _openai_result(response) -> dict:
+    return {
+        "text": response.choices[0].message.content,
+        "usage": _openai_usage(response.usage)
+    }
+
+def _gemini_usage(prompt: str, text: str) -> dict:
+    # Gemini 1.5 Flash Pricing (approx)
+    # Free tier is free, Paid tier: Input $0.075/1M, Output $0.3/1M (Checking updated pricing)
+    # Using Paid tier assumption for calc:
+    
+    # Gemini usage access varies by library version, basic mock if unavailable
+    # Assuming usage available or estimating
+    # Note: genai python SDK usage metadata access is sometimes limited in older versions
+    # Mocking usage for Gemini Free Tier or simple estimation
+    
+    estimated_input = len(prompt) / 4
+    estimated_output = len(text) / 4
+    total_tokens = int(estimated_input + estimated_output)
+    
+    # Mock Cost (Flash is very cheap, often free for low usage)
+    cost_jpy = (total_tokens / 1_000_000) * 0.10 * 150 # Rough estimate
+    
+    return {
+        "total_tokens": total_tokens,
+        "cost_jpy": round(cost_jpy, 4),
+        "note": "Estimated (Gemini)"
+    }
+
+def _gemini_result(prompt: str, text: str) -> dict:
+    return {"text": text, "usage": _gemini_usage(prompt, text)}
+
+async def explain_with_openai(prompt: str) -> dict:
     if not openai_client:
         return {"text": "OpenAI API Key missing.", "usage": None}
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful travel assistant. Reply in Japanese."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=300
-        )
-        content = response.choices[0].message.content
-        usage = response.usage
-        
-        # Cost Calc (GPT-4o-mini approx prices)
-        # Input: $0.15 / 1M tokens, Output: $0.60 / 1M tokens
-        # 1 USD = 150 JPY
-        input_cost_usd = (usage.prompt_tokens / 1_000_000) * 0.15
-        output_cost_usd = (usage.completion_tokens / 1_000_000) * 0.60
-        total_jpy = (input_cost_usd + output_cost_usd) * 150
-        
-        return {
-            "text": content,
-            "usage": {
-                "prompt_tokens": usage.prompt_tokens,
-                "completion_tokens": usage.completion_tokens,
-                "total_tokens": usage.total_tokens,
-                "cost_jpy": round(total_jpy, 4)
-            }
-        }
+        response = await openai_client.chat.completions.create(**_openai_request(prompt))
+        return _openai_result(response)
     except Exception as e:
-        logger.error(f"OpenAI Error: {e}")
+        logger.error("OpenAI Error: %s", e)
         return {"text": f"OpenAI Error: {e}", "usage": None}
 
-def explain_with_gemini(prompt: str) -> dict:
+async def explain_with_gemini(prompt: str) -> dict:
     if not gemini_model:
         return {"text": "Gemini API Key missing.", "usage": None}
     try:
-        # Gemini 1.5 Flash Pricing (approx)
-        # Free tier is free, Paid tier: Input $0.075/1M, Output $0.3/1M (Checking updated pricing)
-        # Using Paid tier assumption for calc:
-        response = gemini_model.generate_content(prompt)
-        text = response.text
-        
-        # Gemini usage access varies by library version, basic mock if unavailable
-        # Assuming usage available or estimating
-        # Note: genai python SDK usage metadata access is sometimes limited in older versions
-        # Mocking usage for Gemini Free Tier or simple estimation
-        
-        estimated_input = len(prompt) / 4
-        estimated_output = len(text) / 4
-        total_tokens = int(estimated_input + estimated_output)
-        
-        # Mock Cost (Flash is very cheap, often free for low usage)
-        cost_jpy = (total_tokens / 1_000_000) * 0.10 * 150 # Rough estimate
-        
-        return {
-            "text": text,
-            "usage": {
-                "total_tokens": total_tokens,
-                "cost_jpy": round(cost_jpy, 4),
-                "note": "Estimated (Gemini)"
-            }
-        }
+        response = await gemini_model.generate_content_async(prompt)
+        return _gemini_result(prompt, response.text)
     except Exception as e:
-        logger.error(f"Gemini Error: {e}")
+        logger.error("Gemini Error: %s", e)
         return {"text": f"Gemini Error: {e}", "usage": None}
 
-def explain_choice(offer_a: Offer, offer_b: Offer = None) -> dict:
+async def generate(prompt: str) -> dict:
+    """Run a prompt against the configured provider."""
+    if get_settings().AI_PROVIDER.lower() == "openai":
+        return await explain_with_openai(prompt)
+    return await explain_with_gemini(prompt)
+
+async def stream_with_openai(prompt: str) -> AsyncIterator[dict]:
+    """Yield {"text": delta} events as tokens arrive, then a final {"usage": ...} event."""
+    if not openai_client:
+        yield {"text": "OpenAI API Key missing."}
+        yield {"usage": None}
+        return
+    try:
+        stream = await openai_client.chat.completions.create(
+            **_openai_request(prompt),
+            stream=True,
+            stream_options={"include_usage": True}  # usage arrives on the last chunk
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield {"text": chunk.choices[0].delta.content}
+            if chunk.usage:
+                yield {"usage": _openai_usage(chunk.usage)}
+    except Exception as e:
+        logger.error("OpenAI Error: %s", e)
+        yield {"error": f"OpenAI Error: {e}"}
+
+async def stream_with_gemini(prompt: str) -> AsyncIterator[dict]:
+    """Yield {"text": delta} events as tokens arrive, then a final {"usage": ...} event."""
+    if not gemini_model:
+        yield {"text": "Gemini API Key missing."}
+        yield {"usage": None}
+        return
+    try:
+        response = await gemini_model.generate_content_async(prompt, stream=True)
+        parts = []
+        async for chunk in response:
+            parts.append(chunk.text)
+            yield {"text": chunk.text}
+        yield {"usage": _gemini_usage(prompt, "".join(parts))}
+    except Exception as e:
+        logger.error("Gemini Error: %s", e)
+        yield {"error": f"Gemini Error: {e}"}
+
+def stream_generate(prompt: str) -> AsyncIterator[dict]:
+    """Streaming variant of generate()."""
+    if get_settings().AI_PROVIDER.lower() == "openai":
+        return stream_with_openai(prompt)
+    return stream_with_gemini(prompt)
+
+def generate_sync(prompt: str) -> dict:
     """
-    Generate explanation using the configured provider. Returns dict with text and usage.
+    Blocking variant of generate() for the scraper threads, which have no event loop.
     """
+    if get_settings().AI_PROVIDER.lower() == "openai":
+        if not openai_sync_client:
+            return {"text": "OpenAI API Key missing.", "usage": None}
+        try:
+            return _openai_result(openai_sync_client.chat.completions.create(**_openai_request(prompt)))
+        except Exception as e:
+            logger.error("OpenAI Error: %s", e)
+            return {"text": f"OpenAI Error: {e}", "usage": None}
+
+    if not gemini_model:
+        return {"text": "Gemini API Key missing.", "usage": None}
+    try:
+        return _gemini_result(prompt, gemini_model.generate_content(prompt).text)
+    except Exception as e:
+        logger.error("Gemini Error: %s", e)
+        return {"text": f"Gemini Error: {e}", "usage": None}
+
+def build_explain_prompt(offer_a: Offer, offer_b: Offer = None) -> str:
+    # rank_offers only assigns the numeric score; build the breakdown on demand
+    if not offer_a.score_breakdown:
+        offer_a.score_breakdown = score_breakdown(offer_a)
     
-    prompt = f"""
-    Please briefly explain why this flight option is good in 2-3 sentences.
-    Focus on value, time, and convenience. Use Japanese.
-
-    Option A:
-    Airline: {offer_a.carrier_main}
-    Price: {offer_a.price} {offer_a.currency}
-    Duration: {offer_a.total_duration_minutes} min
-    Stops: {offer_a.stops}
-    Score Breakdown: {offer_a.score_breakdown}
-    """
-    # ... (Prompt construction same as before) ...
+    prompt = prompts.EXPLAIN.format(a=offer_a)
     if offer_b:
-        prompt += f"""
-        Option B (Comparison):
-        Airline: {offer_b.carrier_main}
-        Price: {offer_b.price} {offer_b.currency}
-        Duration: {offer_b.total_duration_minutes} min
-        Stops: {offer_b.stops}
-        
-        Compare A against B. Highlight why A might be preferred.
-        """
+        prompt += prompts.EXPLAIN_COMPARISON.format(b=offer_b)
+    return prompt
 
-    provider = settings.AI_PROVIDER.lower()
-    
-    if provider == "openai":
-        return explain_with_openai(prompt)
-    else:
-        return explain_with_gemini(prompt)
+def _explain_cache_key(prompt: str) -> str:
+    provider = get_settings().AI_PROVIDER.lower()
+    return hashlib.blake2b(f"{provider}|{prompt}".encode(), digest_size=16).hexdigest()
 
-def analyze_top_offers(offers: list[Offer]) -> dict:
+async def _generate_cached(prompt: str) -> dict:
+    """
+    generate() memoized on the provider and prompt text. The prompt carries every
+    salient offer field, so equal prompts mean an equal question.
+    Errors are not cached.
+    """
+    key = _explain_cache_key(prompt)
+    cached = _explain_cache.get(key)
+    if cached:
+        return {**cached, "cached": True}
+
+    result = await generate(prompt)
+    if result.get("usage") is not None:
+        _explain_cache.set(key, result, ttl_seconds=EXPLAIN_CACHE_TTL)
+    return result
+
+async def explain_choice(offer_a: Offer, offer_b: Offer = None) -> dict:
+    """
+    Generate explanation using the configured provider. Returns dict with text and usage.
+    """
+    return await _generate_cached(build_explain_prompt(offer_a, offer_b))
+
+async def explain_choice_stream(offer_a: Offer, offer_b: Offer = None) -> AsyncIterator[dict]:
+    """
+    Streaming explain_choice: yields {"text": ...} events as the model produces
+    them, then {"usage": ...}. Shares the explanation cache with explain_choice.
+    """
+    prompt = build_explain_prompt(offer_a, offer_b)
+    key = _explain_cache_key(prompt)
+    cached = _explain_cache.get(key)
+    if cached:
+        yield {"text": cached["text"]}
+        yield {"usage": cached["usage"], "cached": True}
+        return
+
+    parts = []
+    usage = None
+    failed = False
+    async for event in stream_generate(prompt):
+        if "text" in event:
+            parts.append(event["text"])
+        elif "usage" in event:
+            usage = event["usage"]
+        else:
+            failed = True
+        yield event
+
+    if usage is not None and not failed:
+        _explain_cache.set(key, {"text": "".join(parts), "usage": usage}, ttl_seconds=EXPLAIN_CACHE_TTL)
+
+async def explain_many(offers: list[Offer]) -> list[dict]:
+    """
+    Explain several offers at once. Requests run concurrently, so the batch
+    costs about one LLM round trip instead of one per offer.
+    """
+    return await asyncio.gather(*(_generate_cached(build_explain_prompt(o)) for o in offers))
+
+async def analyze_top_offers(offers: list[Offer]) -> dict:
     """
     Analyze the top 5 offers globally.
     """
-    # 1. Prepare Summary Context
+    # 1. Prepare Summary Context: read each model field once into a plain dict
     top_5 = offers[:5]
-    summary_text = ""
+    summaries = []
     for idx, o in enumerate(top_5):
-        summary_text += f"""
-        Option {idx+1}: {o.carrier_main} | {o.price:,.0f} {o.currency}
-        Time: {o.segments[0].departure_time} -> {o.segments[-1].arrival_time} (Duration: {o.total_duration_minutes}m)
-        Stops: {o.stops} | Aircraft: {o.segments[0].aircraft} | Seats: {o.segments[0].seats_available}
-        """
-
-    prompt = f"""
-    You are a professional travel agent. Analyze these top flight options for the user.
-    Output a structured recommendation in Japanese.
-
-    Flight Options:
-    {summary_text}
-
-    Please provide:
-    1. 🏆 **Best Overall**: Which one and why?
-    2. 💰 **Best Value**: If different from above.
-    3. ⚡ **Fastest/Most Convenient**: Best for time.
-    4. ⚠️ **Important Notes**: Any warnings about terminals, tight connections, or low seats?
-    
-    Keep it concise and helpful. formatting with Markdown.
-    """
+        first, last = o.segments[0], o.segments[-1]
+        summaries.append({
+            'idx': idx + 1,
+            'carrier': o.carrier_main,
+            'price': o.price,
+            'currency': o.currency,
+            'dep': first.departure_time.isoformat(timespec='minutes'),
+            'arr': last.arrival_time.isoformat(timespec='minutes'),
+            'dur': o.total_duration_minutes,
+            'stops': o.stops,
+            'ac': first.aircraft,
+            'seats': first.seats_available
+        })
+    options = "".join(map(prompts.ANALYZE_OPTION.format_map, summaries))
+    prompt = prompts.ANALYZE.format(options=options)
 
-    provider = settings.AI_PROVIDER.lower()
+    return await generate(prompt)
 
-    if provider == "openai":
-        return explain_with_openai(prompt)
-    else:
-        return explain_with_gemini(prompt)
+def _clean_html(html_content: str) -> str:
+    """
+    Reduce a page to the markup that matters for extraction: the <body> without
+    scripts, styles, inline SVG, comments, inline styles/handlers and data: URIs.
+    Tags, ids and classes are kept so selector repair still has the structure.
+    """
+    body = _BODY_RE.search(html_content)
+    html = body.group(1) if body else html_content
+    html = _NOISE_BLOCK_RE.sub('', html)
+    html = _NOISE_ATTR_RE.sub('', html)
+    return _WHITESPACE_RE.sub(' ', html)
 
 def extract_flights_from_html(html_content: str, origin: str, dest: str, date: str) -> list[dict]:
     """
     Use AI to extract flight information from raw HTML.
     Used as fallback when traditional scraping fails.
     """
-    import json
-    import re
-    
-    # Truncate HTML to avoid token limits (keep first 30k chars usually enough for top results)
-    # Better approach would be to only keep body text or specific containers
-    truncated_html = html_content[:30000]
-    
-    prompt = f"""
-    You are an expert web scraper. Extract flight information from the following HTML snippet.
-    The page contains domestic Japan flights from {origin} to {dest} on {date}.
-    
-    HTML Content:
-    ```html
-    {truncated_html}
-    ... (truncated)
-    ```
-    
-    Task:
-    Identify flight results in the HTML. For each flight, extract:
-    1. Flight Number (e.g., ANA123, JL456)
-    2. Departure Time (HH:MM)
-    3. Arrival Time (HH:MM)
-    4. Price (in JPY, just the number)
-    5. Airline Code (e.g., NH for ANA, JL for JAL)
-    
-    Output Format:
-    Return ONLY a valid JSON array of objects. No markdown formatting, no explanations.
-    Example:
-    [
-      {{
-        "airline": "NH",
-        "flight_number": "123",
-        "departure_time": "10:00",
-        "arrival_time": "11:30",
-        "price": 15000,
-        "origin": "{origin}",
-        "destination": "{dest}", 
-        "date": "{date}",
-        "id": "AI_EXTRACTED_1"
-      }}
-    ]
-    
-    If no flights are found, return empty array [].
-    """
+    # Strip non-content markup, then truncate to avoid token limits
+    truncated_html = _clean_html(html_content)[:MAX_HTML_CHARS]
     
-    provider = settings.AI_PROVIDER.lower()
+    prompt = prompts.EXTRACT_HTML.format(origin=origin, dest=dest, date=date, html=truncated_html)
     
     try:
-        response_dict = {}
-        if provider == "openai":
-            response_dict = explain_with_openai(prompt)
-        else:
-            response_dict = explain_with_gemini(prompt)
-            
+        response_dict = generate_sync(prompt)
+
         text = response_dict.get('text', '').strip()
         
         # Clean up code blocks if present
-        text = re.sub(r'^```json\s*', '', text)
-        text = re.sub(r'^```\s*', '', text)
-        text = re.sub(r'\s*```$', '', text)
+        text = _FENCE_RE.sub('', text)
         
-        flights = json.loads(text)
+        flights = orjson.loads(text)
         
         # Validate data structure
         valid_flights = []
@@ -253,64 +357,47 @@ def extract_flights_from_html(html_content: str, origin: str, dest: str, date: s
                 f['id'] = f"AI_{idx}_{f['flight_number']}"
                 valid_flights.append(f)
                 
-        logger.info(f"AI extracted {len(valid_flights)} flights from HTML")
+        logger.info("AI extracted %d flights from HTML", len(valid_flights))
         return valid_flights
         
     except Exception as e:
-        logger.error(f"AI HTML Extraction Error: {e}")
+        logger.error("AI HTML Extraction Error: %s", e)
         return []
 
 def generate_json_selector_fix(html_content: str, extracted_data: list[dict]) -> dict:
     """
     Ask AI to analyze the HTML and suggest new CSS selectors in JSON format.
     """
-    import json
-    
-    truncated_html = html_content[:30000]
+    truncated_html = _clean_html(html_content)[:MAX_HTML_CHARS]
     sample_data = str(extracted_data[:2])
     
-    prompt = f"""
-    You represent a Self-Healing Code System.
-    The web scraper's CSS selectors failed, but an AI fallback successfully extracted data.
-    
-    Your task: Reverse-engineer the CORRECT Playwright CSS selectors based on the HTML and Extracted Data.
-    
-    HTML Context:
-    ```html
-    {truncated_html}
-    ...
-    ```
-    
-    Target Data:
-    {sample_data}
-    
-    Output Format:
-    Return ONLY a valid JSON object with the following keys. No markdown, no code blocks.
-    {{
-      "container": "CSS selector for the list item (e.g. li.flight-row)",
-      "flight_number": "CSS selector relative to container for flight number",
-      "departure_time": "CSS selector relative to container for dep time",
-      "arrival_time": "CSS selector relative to container for arr time",
-      "price": "CSS selector relative to container for price"
-    }}
-    """
-    
-    provider = settings.AI_PROVIDER.lower()
+    prompt = prompts.FIX_SELECTORS.format(html=truncated_html, sample_data=sample_data)
     
     try:
-        response_dict = {}
-        if provider == "openai":
-            response_dict = explain_with_openai(prompt)
-        else:
-            response_dict = explain_with_gemini(prompt)
-            
+        response_dict = generate_sync(prompt)
+
         text = response_dict.get('text', '').strip()
         # Clean markdown
-        text = re.sub(r'^```json\s*', '', text)
-        text = re.sub(r'^```\s*', '', text)
-        text = re.sub(r'\s*```$', '', text)
+        text = _FENCE_RE.sub('', text)
         
-        return json.loads(text)
+        return orjson.loads(text)
     except Exception as e:
-        logger.error(f"AI JSON Selector Generation Error: {e}")
+        logger.error("AI JSON Selector Generation Error: %s", e)
         return None
+
+def save_selector_fix(html_content: str, extracted_data: list[dict], path: str) -> bool:
+    """
+    Generate a selector fix and write it to path for review in Settings.
+    Scrapers run this in the background; returns whether a suggestion was saved.
+    """
+    try:
+        suggestion = generate_json_selector_fix(html_content, extracted_data)
+        if not suggestion:
+            return False
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(suggestion, option=orjson.OPT_INDENT_2))
+        logger.warning("✅ Config suggestion saved to %s", path)
+        return True
+    except Exception as e:
+        logger.error("Self-healing generation failed: %s", e)
+        return False
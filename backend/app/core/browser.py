@@ -0,0 +1,169 @@
+"""
+Shared Playwright browser pool for the web scrapers (ANA, ENA).
+Launching Chromium costs seconds, so browsers are kept warm and reused;
+each scrape opens its own context on a pooled browser.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from playwright.sync_api import sync_playwright
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    # Background services a scraper never needs. Playwright already passes
+    # --disable-background-networking, --disable-breakpad, --disable-sync,
+    # --no-first-run and its own --disable-features list (a second
+    # --disable-features would replace it, so none is added here).
+    "--disable-gpu",
+    "--disable-component-update",
+    "--disable-domain-reliability",
+    "--disable-translate",
+    "--safebrowsing-disable-auto-update",
+]
+
+# Resources the scrapers never read. Stylesheets are kept: both scrapers depend on
+# CSS for visibility checks and layout-aware innerText.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+BLOCKED_URL_PARTS = ("google-analytics", "googletagmanager", "doubleclick", "facebook")
+
+def _block_unneeded(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(part in request.url for part in BLOCKED_URL_PARTS):
+        route.abort()
+    else:
+        route.continue_()
+
+def block_unneeded_resources(context):
+    """Abort image/media/font and tracker requests for every page of the context."""
+    context.route("**/*", _block_unneeded)
+
+# Browsers are recycled after this many scrapes or this many seconds
+MAX_USES_PER_INSTANCE = 50
+MAX_INSTANCE_AGE_SECONDS = 300
+# Contexts left open (auto_close=False) beyond this count also trigger a recycle
+MAX_OPEN_CONTEXTS = 4
+
+class _BrowserWorker:
+    """
+    One warm Chromium plus the thread that owns it.
+    Sync Playwright objects may only be used on the thread that created them,
+    so every call on this browser is run on the worker's own executor.
+    """
+    def __init__(self, name: str):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._pw = None
+        self._browser = None
+        self._headless = None
+        self.uses = 0
+        self.created_at = 0.0
+
+    def run(self, fn, headless: bool):
+        """Call fn(browser) on the worker thread and return its result."""
+        return self._executor.submit(lambda: fn(self._get_browser(headless))).result()
+
+    def _get_browser(self, headless: bool):
+        if self._browser is not None and (
+            not self._browser.is_connected()
+            or self._headless != headless
+            or self.uses >= MAX_USES_PER_INSTANCE
+            or time.monotonic() - self.created_at > MAX_INSTANCE_AGE_SECONDS
+            or len(self._browser.contexts) >= MAX_OPEN_CONTEXTS
+        ):
+            self._stop()
+
+        if self._browser is None:
+            logger.info("Launching scraper browser (headless=%s)", headless)
+            self._pw = sync_playwright().start()
+            self._browser = self._pw.chromium.launch(headless=headless, args=LAUNCH_ARGS)
+            self._headless = headless
+            self.uses = 0
+            self.created_at = time.monotonic()
+
+        self.uses += 1
+        return self._browser
+
+    def _stop(self):
+        browser, pw = self._browser, self._pw
+        self._browser = self._pw = None
+        try:
+            if browser: browser.close()
+        except Exception:
+            pass
+        try:
+            if pw: pw.stop()
+        except Exception:
+            pass
+
+    def close(self):
+        try:
+            self._executor.submit(self._stop).result(timeout=10)
+        except Exception:
+            pass  # Executor already shut down at exit; the browser goes with the driver process
+        self._executor.shutdown(wait=False)
+
+class BrowserPool:
+    """Bounded pool of warm browsers; concurrent scrapes each take their own worker."""
+    def __init__(self, size: int):
+        self._workers = [_BrowserWorker(f"scraper-browser-{i}") for i in range(size)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def acquire(self) -> _BrowserWorker:
+        return self._idle.get()
+
+    def release(self, worker: _BrowserWorker):
+        self._idle.put(worker)
+
+    def run(self, fn, headless: bool):
+        worker = self.acquire()
+        try:
+            return worker.run(fn, headless)
+        finally:
+            self.release(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool() -> BrowserPool:
+    """Process-wide pool shared by all scrapers, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(max(1, get_settings().SCRAPER_BROWSER_POOL_SIZE))
+        return _pool
+
+# Threads that wait on the pool for async callers (spawned on demand, reused across calls).
+# Also runs the scrapers' background AI self-healing; queued jobs still finish at
+# interpreter exit, since concurrent.futures joins its workers then.
+SCRAPE_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="scrape")
+
+async def run_scrape_async(fn, *args, **kwargs):
+    """
+    Await a blocking scrape function from the event loop.
+    The wait for a pooled browser happens on a SCRAPE_EXECUTOR thread, so
+    concurrent awaits scrape in parallel without blocking the loop.
+    """
+    return await asyncio.wrap_future(SCRAPE_EXECUTOR.submit(fn, *args, **kwargs))
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.close()
@@ -3,28 +3,50 @@ from typing import Any, Optional
 import threading
 
 class SimpleCache:
-    def __init__(self):
-        self._store = {}
-        self._lock = threading.Lock()
+    """
+    In-memory TTL cache.
+    Keys are spread over independently locked shards so concurrent requests
+    rarely wait on each other, and each shard is size-bounded.
+    """
+    def __init__(self, maxsize: int = 10_000, shards: int = 16):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._shard_maxsize = max(1, maxsize // shards)
+
+    def _shard(self, key: str) -> tuple[dict, threading.Lock]:
+        return self._shards[hash(key) % len(self._shards)]
 
     def get(self, key: str) -> Optional[Any]:
-        with self._lock:
-            if key in self._store:
-                value, expire_at = self._store[key]
+        store, lock = self._shard(key)
+        with lock:
+            if key in store:
+                value, expire_at = store[key]
                 if time.time() < expire_at:
                     return value
                 else:
-                    del self._store[key]
+                    del store[key]
         return None
 
     def set(self, key: str, value: Any, ttl_seconds: int = 300):
-        with self._lock:
-            expire_at = time.time() + ttl_seconds
-            self._store[key] = (value, expire_at)
+        store, lock = self._shard(key)
+        with lock:
+            now = time.time()
+            if key not in store and len(store) >= self._shard_maxsize:
+                self._evict(store, now)
+            store[key] = (value, now + ttl_seconds)
+
+    @staticmethod
+    def _evict(store: dict, now: float):
+        # Drop expired entries first; if none expired, drop the oldest insert
+        expired = [k for k, (_, expire_at) in store.items() if expire_at <= now]
+        for k in expired:
+            del store[k]
+        if not expired:
+            del store[next(iter(store))]
 
     def clear(self):
-        with self._lock:
-            self._store.clear()
+        for store, lock in self._shards:
+            with lock:
+                store.clear()
 
 # Global cache instance
 cache = SimpleCache()
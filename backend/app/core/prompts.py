@@ -0,0 +1,113 @@
+"""
+Prompt templates for app.core.ai.
+Templates are plain str.format strings, built once at import time; literal
+braces in the JSON examples are doubled.
+"""
+
+EXPLAIN = """
+Please briefly explain why this flight option is good in 2-3 sentences.
+Focus on value, time, and convenience. Use Japanese.
+
+Option A:
+Airline: {a.carrier_main}
+Price: {a.price} {a.currency}
+Duration: {a.total_duration_minutes} min
+Stops: {a.stops}
+Score Breakdown: {a.score_breakdown}
+"""
+
+EXPLAIN_COMPARISON = """
+Option B (Comparison):
+Airline: {b.carrier_main}
+Price: {b.price} {b.currency}
+Duration: {b.total_duration_minutes} min
+Stops: {b.stops}
+
+Compare A against B. Highlight why A might be preferred.
+"""
+
+ANALYZE_OPTION = """
+Option {idx}: {carrier} | {price:,.0f} {currency}
+Time: {dep} -> {arr} (Duration: {dur}m)
+Stops: {stops} | Aircraft: {ac} | Seats: {seats}
+"""
+
+ANALYZE = """
+You are a professional travel agent. Analyze these top flight options for the user.
+Output a structured recommendation in Japanese.
+
+Flight Options:
+{options}
+
+Please provide:
+1. 🏆 **Best Overall**: Which one and why?
+2. 💰 **Best Value**: If different from above.
+3. ⚡ **Fastest/Most Convenient**: Best for time.
+4. ⚠️ **Important Notes**: Any warnings about terminals, tight connections, or low seats?
+
+Keep it concise and helpful. formatting with Markdown.
+"""
+
+EXTRACT_HTML = """
+You are an expert web scraper. Extract flight information from the following HTML snippet.
+The page contains domestic Japan flights from {origin} to {dest} on {date}.
+
+HTML Content:
+```html
+{html}
+... (truncated)
+```
+
+Task:
+Identify flight results in the HTML. For each flight, extract:
+1. Flight Number (e.g., ANA123, JL456)
+2. Departure Time (HH:MM)
+3. Arrival Time (HH:MM)
+4. Price (in JPY, just the number)
+5. Airline Code (e.g., NH for ANA, JL for JAL)
+
+Output Format:
+Return ONLY a valid JSON array of objects. No markdown formatting, no explanations.
+Example:
+[
+  {{
+    "airline": "NH",
+    "flight_number": "123",
+    "departure_time": "10:00",
+    "arrival_time": "11:30",
+    "price": 15000,
+    "origin": "{origin}",
+    "destination": "{dest}",
+    "date": "{date}",
+    "id": "AI_EXTRACTED_1"
+  }}
+]
+
+If no flights are found, return empty array [].
+"""
+
+FIX_SELECTORS = """
+You represent a Self-Healing Code System.
+The web scraper's CSS selectors failed, but an AI fallback successfully extracted data.
+
+Your task: Reverse-engineer the CORRECT Playwright CSS selectors based on the HTML and Extracted Data.
+
+HTML Context:
+```html
+{html}
+...
+```
+
+Target Data:
+{sample_data}
+
+Output Format:
+Return ONLY a valid JSON object with the following keys. No markdown, no code blocks.
+{{
+  "container": "CSS selector for the list item (e.g. li.flight-row)",
+  "flight_number": "CSS selector relative to container for flight number",
+  "departure_time": "CSS selector relative to container for dep time",
+  "arrival_time": "CSS selector relative to container for arr time",
+  "price": "CSS selector relative to container for price"
+}}
+"""
@@ -1,51 +1,65 @@
 from app.models import Offer
 from typing import List, Dict, Optional
+import heapq
+
+# Rule weights
+BASE_SCORE = 1000.0
+PRICE_PENALTY_PER_JPY = 1 / 1000.0  # -1 point per 1000 JPY (arbitrary scaling)
+DURATION_PENALTY_PER_MIN = 1 / 10.0  # -1 point per 10 minutes
+STOP_PENALTY = 50.0  # -50 points per stop
+PREFERRED_CARRIER_BONUS = 100.0
+
+def _score_terms(offer: Offer, preferred_carrier: Optional[str]) -> Dict[str, float]:
+    """
+    Signed points each rule adds to BASE_SCORE. The score and its breakdown
+    are both derived from these, so they can't disagree.
+    """
+    terms = {
+        'price': -offer.price * PRICE_PENALTY_PER_JPY,
+        'duration': -offer.total_duration_minutes * DURATION_PENALTY_PER_MIN,
+        'stops': -offer.stops * STOP_PENALTY,
+    }
+    if preferred_carrier and offer.carrier_main == preferred_carrier:
+        terms['carrier'] = PREFERRED_CARRIER_BONUS
+    return terms
 
 def calculate_score(offer: Offer, prefs: Dict = None) -> float:
     """
     Calculate a score for the offer based on rules.
     Higher score is better.
     Base score: 1000.
+    Numeric only; the human-readable breakdown is score_breakdown().
     """
-    score = 1000.0
-    breakdown = {}
-    
-    prefs = prefs or {}
-    
-    # 1. Price Factor
-    # Penalty: -1 point per 1000 JPY (arbitrary scaling)
-    price_penalty = offer.price / 1000.0
-    score -= price_penalty
-    breakdown['price'] = f"-{price_penalty:.1f} (Price: {offer.price})"
-
-    # 2. Duration Factor
-    # Penalty: -1 point per 10 minutes
-    duration_penalty = offer.total_duration_minutes / 10.0
-    score -= duration_penalty
-    breakdown['duration'] = f"-{duration_penalty:.1f} (Duration: {offer.total_duration_minutes}m)"
-
-    # 3. Stops Factor
-    # Penalty: -50 points per stop
-    stops_penalty = offer.stops * 50.0
-    score -= stops_penalty
-    breakdown['stops'] = f"-{stops_penalty:.1f} ({offer.stops} stops)"
-
-    # 4. Carrier Preference (Example)
-    preferred_carrier = prefs.get('carrier')
-    if preferred_carrier and offer.carrier_main == preferred_carrier:
-        score += 100
-        breakdown['carrier'] = f"+100 (Preferred: {preferred_carrier})"
-
+    score = BASE_SCORE + sum(_score_terms(offer, (prefs or {}).get('carrier')).values())
     offer.score = score
-    offer.score_breakdown = breakdown
     return score
 
-def rank_offers(offers: List[Offer], prefs: Dict = None) -> List[Offer]:
+def score_breakdown(offer: Offer, prefs: Dict = None) -> Dict[str, str]:
     """
-    Score and sort offers. Returns the sorted list.
+    Human-readable score breakdown, built on demand (e.g. for /explain).
+    Ranking itself only computes the numeric score.
     """
-    for offer in offers:
-        calculate_score(offer, prefs)
-    
-    # Sort descending by score
-    return sorted(offers, key=lambda x: x.score, reverse=True)
+    preferred_carrier = (prefs or {}).get('carrier')
+    labels = {
+        'price': f"Price: {offer.price}",
+        'duration': f"Duration: {offer.total_duration_minutes}m",
+        'stops': f"{offer.stops} stops",
+        'carrier': f"Preferred: {preferred_carrier}",
+    }
+    return {name: f"{points:+.1f} ({labels[name]})" for name, points in _score_terms(offer, preferred_carrier).items()}
+
+def rank_offers(offers: List[Offer], prefs: Dict = None, top_k: Optional[int] = None) -> List[Offer]:
+    """
+    Score and sort offers. Returns the sorted list, or only the best top_k.
+    Scoring here is numeric only; the human-readable breakdown is built by
+    score_breakdown when a single offer is explained.
+    """
+    scores = [calculate_score(offer, prefs) for offer in offers]
+
+    # Sort descending by score (keys precomputed, no per-comparison attribute access)
+    if top_k is not None and top_k < len(offers):
+        # Partial selection: O(N log K) instead of a full sort
+        order = heapq.nlargest(top_k, range(len(offers)), key=scores.__getitem__)
+    else:
+        order = sorted(range(len(offers)), key=scores.__getitem__, reverse=True)
+    return [offers[i] for i in order]
@@ -1,22 +1,46 @@
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from app.models import Offer
-from app.skills.search_offers import search_offers
+from app.skills.search_offers import close_http_client, search_offers
 from app.skills.normalize_offers import normalize_offers
 from app.core.ranking import rank_offers
-from app.core.ai import explain_choice
+from app.core.ai import explain_choice_stream, explain_many
 from app.core.cache import cache
-from app.config import settings
+from app.config import get_settings
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
 import hashlib
-import json
 import logging
+import orjson
+import os
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Air Ticket Agent", version="1.0.0")
+def _orjson_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class OrjsonResponse(JSONResponse):
+    """
+    JSON response encoded with orjson. Pydantic models (e.g. Offer) are dumped
+    while encoding, so handlers can return them without jsonable_encoder.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_orjson_default)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled provider connections on shutdown
+    await close_http_client()
+
+app = FastAPI(title="Air Ticket Agent", version="1.0.0", default_response_class=OrjsonResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,33 +60,54 @@ class SearchRequest(BaseModel):
     time_range: str | None = None # 'morning', 'afternoon', 'evening'
     flexible_ticket: bool = False # True = Changeable
 
+# Maximum number of offers returned by /search
+SEARCH_RESULT_LIMIT = 50
+
 def generate_cache_key(req: SearchRequest) -> str:
-    return hashlib.md5(f"{req.origin}-{req.destination}-{req.date}-{req.adults}-{req.time_range}-{req.flexible_ticket}".encode()).hexdigest()
+    # Use '|' as separator: unlike '-', it does not occur in dates or city names
+    key = f"{req.origin}|{req.destination}|{req.date}|{req.adults}|{req.time_range}|{req.flexible_ticket}"
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+def _search_response(offers_json: bytes, headers: dict | None = None, **meta) -> Response:
+    """
+    Build the /search body around an already-encoded offer list.
+    Only the small meta fields are encoded per request; cache hits cost a byte copy.
+    """
+    meta_json = orjson.dumps(meta)
+    # Splice the meta object's fields in after "offers" (or just close the envelope)
+    tail = b'}' if meta_json == b'{}' else b',' + meta_json[1:]
+    body = b'{"offers":' + offers_json + tail
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.post("/search")
 async def search_flights(request: SearchRequest):
     import time
     start_time = time.time()
     
-    logger.info(f"Search request: {request.origin}->{request.destination}, mode={request.searchMode}, time={request.time_range}, flex={request.flexible_ticket}")
+    logger.info("Search request: %s->%s, mode=%s, time=%s, flex=%s", request.origin, request.destination, request.searchMode, request.time_range, request.flexible_ticket)
     
     # Generate cache key (used for both lookup and storage)
     cache_key = generate_cache_key(request)
     
     # 1. Check Cache (skip for scraper mode to show live browser)
     if request.searchMode != "scraper":
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.info(f"Cache hit for {cache_key}")
+        cached_offers_json = cache.get(cache_key)
+        if cached_offers_json:
+            logger.info("Cache hit for %s", cache_key)
             elapsed = time.time() - start_time
-            return {"offers": cached_result, "latency_seconds": round(elapsed, 3), "cached": True}
+            return _search_response(
+                cached_offers_json,
+                headers={"X-Cache": "HIT"},
+                latency_seconds=round(elapsed, 3),
+                cached=True
+            )
     else:
         logger.info("Scraper mode: skipping cache to show live browser")
 
     # 2. Search (External APIs or Scraper)
     logger.info("Cache miss or scraper mode. Calling search...")
     # Call search skill
-    raw_offers_result, warning_msg = search_offers(
+    raw_offers_result, warning_msg = await search_offers(
         origin=request.origin,
         dest=request.destination,
         date=request.date,
@@ -70,32 +115,36 @@ async def search_flights(request: SearchRequest):
         search_mode=request.searchMode,
         trip_type=request.trip_type,
         time_range=request.time_range,
-        flexible_ticket=request.flexible_ticket
+        flexible_ticket=request.flexible_ticket,
+        max_results=SEARCH_RESULT_LIMIT
     )
     
-    logger.info(f"search_offers returned {len(raw_offers_result)} raw offers")
+    logger.info("search_offers returned %d raw offers", len(raw_offers_result))
     
     if not raw_offers_result:
         elapsed = time.time() - start_time
-        return {"offers": [], "latency_seconds": round(elapsed, 3), "warning": warning_msg}
+        return OrjsonResponse({"offers": [], "latency_seconds": round(elapsed, 3), "warning": warning_msg})
 
     # 3. Normalize
     normalized_offers = normalize_offers(raw_offers_result)
     
-    # 4. Rank
-    ranked_offers = rank_offers(normalized_offers)
+    # 4. Rank (only the best SEARCH_RESULT_LIMIT are returned)
+    ranked_offers = rank_offers(normalized_offers, top_k=SEARCH_RESULT_LIMIT)
     
-    # 5. Cache Result (TTL 5 mins) - only for API mode
-    if request.searchMode != "scraper":
-        cache.set(cache_key, ranked_offers, ttl_seconds=300)
+    # 5. Encode once; Cache the encoded offers (TTL 5 mins) - only for API mode.
+    # Empty results aren't cached (the encoded b"[]" would read as a hit), so
+    # the next request searches again, as before bytes were cached.
+    offers_json = orjson.dumps(ranked_offers, default=_orjson_default)
+    if ranked_offers and request.searchMode != "scraper":
+        cache.set(cache_key, offers_json, ttl_seconds=300)
     
     elapsed = time.time() - start_time
-    return {
-        "offers": ranked_offers, 
-        "latency_seconds": round(elapsed, 3), 
-        "cached": False,
-        "warning": warning_msg
-    }
+    return _search_response(
+        offers_json,
+        latency_seconds=round(elapsed, 3),
+        cached=False,
+        warning=warning_msg
+    )
 
 class ExplainRequest(BaseModel):
     target_offer: Offer
@@ -103,9 +152,23 @@ class ExplainRequest(BaseModel):
 
 @app.post("/explain")
 async def explain_flight(request: ExplainRequest):
-    result = explain_choice(request.target_offer, request.comparison_offer)
-    # result is now a dict {text: ..., usage: ...}
-    return result
+    # Server-Sent Events: text deltas as soon as the model emits them,
+    # then the usage event and a final done marker
+    async def events():
+        async for event in explain_choice_stream(request.target_offer, request.comparison_offer):
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
+        yield b'data: {"done":true}\n\n'
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+class ExplainBatchRequest(BaseModel):
+    offers: list[Offer]
+
+@app.post("/explain_batch")
+async def explain_flights_batch(request: ExplainBatchRequest):
+    # One explanation per offer, fetched concurrently
+    results = await explain_many(request.offers)
+    return {"results": results}
 
 class AnalyzeRequest(BaseModel):
     offers: list[Offer]
@@ -114,71 +177,75 @@ class AnalyzeRequest(BaseModel):
 async def analyze_flights(request: AnalyzeRequest):
     try:
         from app.core.ai import analyze_top_offers
-        return analyze_top_offers(request.offers)
+        return await analyze_top_offers(request.offers)
     except Exception as e:
-        logger.error(f"Analysis Failed: {e}")
+        logger.error("Analysis Failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- Scraper Configuration Endpoints ---
 
+SCRAPER_CONFIG_PATH = "scraper_config.json"
+SCRAPER_SUGGESTION_PATH = "scraper_config_suggestion.json"
+
+# path -> (mtime_ns, parsed JSON)
+_json_file_cache: dict[str, tuple[int, dict]] = {}
+
+def _read_json_file(path: str) -> dict | None:
+    """
+    Load a JSON file, reusing the parsed content while its mtime is unchanged.
+    Returns None if the file is missing or unreadable.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        _json_file_cache.pop(path, None)
+        return None
+
+    cached = _json_file_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
+    except Exception:
+        return None
+    _json_file_cache[path] = (mtime, data)
+    return data
+
+def _write_scraper_config(new_config: dict):
+    with open(SCRAPER_CONFIG_PATH, "wb") as f:
+        f.write(orjson.dumps(new_config, option=orjson.OPT_INDENT_2))
+
+    # If successfully updated, remove the suggestion file if it exists
+    # (Assuming user applied the suggestion)
+    if os.path.exists(SCRAPER_SUGGESTION_PATH):
+        os.remove(SCRAPER_SUGGESTION_PATH)
+
 @app.get("/scraper/config")
 async def get_scraper_config():
     """
     Get current scraper config and any pending AI suggestions.
     """
-    import json
-    import os
-    
-    config = {}
-    suggestion = None
-    
-    config_path = "scraper_config.json"
-    suggestion_path = "scraper_config_suggestion.json"
-    
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, "r") as f:
-                config = json.load(f)
-        except Exception:
-            pass
-            
-    if os.path.exists(suggestion_path):
-        try:
-            with open(suggestion_path, "r") as f:
-                suggestion = json.load(f)
-        except Exception:
-            pass
-            
-    return {"config": config, "suggestion": suggestion}
+    # File I/O runs in a worker thread so it never blocks the event loop
+    config = await asyncio.to_thread(_read_json_file, SCRAPER_CONFIG_PATH)
+    suggestion = await asyncio.to_thread(_read_json_file, SCRAPER_SUGGESTION_PATH)
+    return {"config": config or {}, "suggestion": suggestion}
 
 @app.post("/scraper/config")
 async def update_scraper_config(new_config: dict = Body(...)):
     """
     Update the scraper configuration.
     """
-    import json
-    import os
-    from datetime import datetime
-    
-    config_path = "scraper_config.json"
-    suggestion_path = "scraper_config_suggestion.json"
-    
     # Update timestamp
     new_config["last_updated"] = datetime.now().isoformat()
     
     try:
-        with open(config_path, "w") as f:
-            json.dump(new_config, f, indent=2)
-            
-        # If successfully updated, remove the suggestion file if it exists
-        # (Assuming user applied the suggestion)
-        if os.path.exists(suggestion_path):
-            os.remove(suggestion_path)
-            
+        await asyncio.to_thread(_write_scraper_config, new_config)
         return {"status": "success", "message": "Configuration updated"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "env": settings.ENV}
+    return {"status": "ok", "env": get_settings().ENV}
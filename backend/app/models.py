@@ -30,7 +30,7 @@ class Offer(BaseModel):
     
     # Internal scoring fields
     score: Optional[float] = 0.0
-    score_breakdown: Optional[dict] = {}
+    score_breakdown: Optional[dict] = None
 
     class Config:
         from_attributes = True
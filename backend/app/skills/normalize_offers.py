@@ -1,17 +1,27 @@
 from app.models import Offer, Segment
 from datetime import datetime
+import logging
 import re
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Models are built with model_construct: every value below is already parsed
+# and coerced here, so Pydantic validation would only repeat that work.
+# Offers coming back from the client (/explain, /analyze) are still validated.
+# Airport and carrier codes repeat across thousands of segments, so they are
+# interned: one shared string per code, compared by identity.
+
+# Amadeus uses PTxxHxxM format
+_DURATION_RE = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?')
 
 def parse_duration(pt_duration: str) -> int:
     """Parse ISO 8601 duration (PT1H30M) to minutes."""
-    # Amadeus uses PTxxHxxM format
-    match = re.match(r'PT(?:(\d+)H)?(?:(\d+)M)?', pt_duration)
+    match = _DURATION_RE.match(pt_duration)
     if not match:
         return 0
-    h = int(match.group(1) or 0)
-    m = int(match.group(2) or 0)
-    m = int(match.group(2) or 0)
-    return h * 60 + m
+    h, m = match.groups(0)
+    return int(h) * 60 + int(m)
 
 def extract_cabin(raw: dict) -> str:
     """Safely extract cabin class."""
@@ -21,7 +31,7 @@ def extract_cabin(raw: dict) -> str:
         fds = tps[0].get('fareDetailsBySegment', [])
         if not fds: return "ECONOMY"
         return fds[0].get('cabin', "ECONOMY")
-    except:
+    except (AttributeError, IndexError, KeyError, TypeError):
         return "ECONOMY"
 
 def normalize_amadeus_offer(raw: dict) -> Offer:
@@ -33,34 +43,38 @@ def normalize_amadeus_offer(raw: dict) -> Offer:
     
     total_duration = parse_duration(itinerary['duration'])
     
+    # Offer-level values, shared by every segment
+    cabin = extract_cabin(raw)
+    seats = raw.get('numberOfBookableSeats')
+    
     for seg in itinerary['segments']:
-        segments.append(Segment(
-            departure_iata=seg['departure']['iataCode'],
-            arrival_iata=seg['arrival']['iataCode'],
+        segments.append(Segment.model_construct(
+            departure_iata=sys.intern(seg['departure']['iataCode']),
+            arrival_iata=sys.intern(seg['arrival']['iataCode']),
             departure_time=datetime.fromisoformat(seg['departure']['at']),
             arrival_time=datetime.fromisoformat(seg['arrival']['at']),
-            carrier_code=seg['carrierCode'],
+            carrier_code=sys.intern(seg['carrierCode']),
             flight_number=seg['number'],
             duration_minutes=parse_duration(seg['duration']),
             # Rich Data Extraction (Safe access)
             terminal=seg['departure'].get('terminal'),
             aircraft=seg.get('aircraft', {}).get('code'),
-            cabin_class=extract_cabin(raw),
-            seats_available=raw.get('numberOfBookableSeats')
+            cabin_class=cabin,
+            seats_available=seats
         ))
         
     # Currency Conversion Removed - handled by frontend
     price = float(raw['price']['total'])
     currency = raw['price']['currency']
 
-    return Offer(
+    return Offer.model_construct(
         id=raw['id'],
         source='amadeus',
         price=price, 
         currency=currency,
         total_duration_minutes=total_duration,
         segments=segments,
-        carrier_main=raw['validatingAirlineCodes'][0] if raw.get('validatingAirlineCodes') else segments[0].carrier_code,
+        carrier_main=sys.intern(raw['validatingAirlineCodes'][0]) if raw.get('validatingAirlineCodes') else segments[0].carrier_code,
         stops=len(segments) - 1
     )
 
@@ -82,18 +96,19 @@ def normalize_serpapi_offer(raw: dict) -> Offer:
     
     current_flights = raw.get('flights', [])
     for f in current_flights:
-        segments.append(Segment(
-            departure_iata=f.get('departure_airport', {}).get('id'),
-            arrival_iata=f.get('arrival_airport', {}).get('id'),
-            departure_time=datetime.strptime(f['departure_time'], '%Y-%m-%d %H:%M') if 'departure_time' in f else datetime.now(), # Format might vary
-            arrival_time=datetime.strptime(f['arrival_time'], '%Y-%m-%d %H:%M') if 'arrival_time' in f else datetime.now(),
-            carrier_code=f.get('airline_code', ''),
+        segments.append(Segment.model_construct(
+            departure_iata=sys.intern(f.get('departure_airport', {}).get('id') or ''),
+            arrival_iata=sys.intern(f.get('arrival_airport', {}).get('id') or ''),
+            # SerpApi sends 'YYYY-MM-DD HH:MM'; fromisoformat parses it in C, unlike strptime
+            departure_time=datetime.fromisoformat(f['departure_time']) if 'departure_time' in f else datetime.now(), # Format might vary
+            arrival_time=datetime.fromisoformat(f['arrival_time']) if 'arrival_time' in f else datetime.now(),
+            carrier_code=sys.intern(f.get('airline_code', '')),
             flight_number=f.get('flight_number', ''),
             duration_minutes=f.get('duration', 0),
             cabin_class=f.get('travel_class')
         ))
 
-    return Offer(
+    return Offer.model_construct(
         id=raw.get('token', 'serp_' + str(raw.get('price'))), # SerpApi might not have ID
         source='serpapi',
         price=float(raw.get('price', 0)),
@@ -129,6 +144,7 @@ def normalize_ana_offer(raw: dict) -> Offer:
     """
     segments = []
     total_duration_minutes = 0
+    carrier = sys.intern(raw.get('carrier_main', 'ANA'))
     
     for seg in raw.get('segments', []):
         # Parse times
@@ -140,12 +156,12 @@ def normalize_ana_offer(raw: dict) -> Offer:
         duration_minutes = int(duration_td.total_seconds() / 60)
         total_duration_minutes += duration_minutes
         
-        segments.append(Segment(
-            departure_iata=seg['departure_iatacode'],
-            arrival_iata=seg['arrival_iatacode'],
+        segments.append(Segment.model_construct(
+            departure_iata=sys.intern(seg['departure_iatacode']),
+            arrival_iata=sys.intern(seg['arrival_iatacode']),
             departure_time=dep_time,
             arrival_time=arr_time,
-            carrier_code=raw.get('carrier_main', 'ANA'),
+            carrier_code=carrier,
             flight_number=seg['flight_number'],
             duration_minutes=duration_minutes,
             terminal=None,
@@ -154,38 +170,41 @@ def normalize_ana_offer(raw: dict) -> Offer:
             seats_available=seg.get('seats_available', 9)
         ))
     
-    return Offer(
+    return Offer.model_construct(
         id=raw['id'],
         source=raw['source'],
-        price=raw['price'],
+        price=float(raw['price']),
         currency=raw['currency'],
         segments=segments,
         total_duration_minutes=total_duration_minutes,
-        carrier_main=raw.get('carrier_main', 'ANA'),
+        carrier_main=carrier,
         stops=len(segments) - 1  # 0 for direct, 1+ for connecting
     )
 
 
+# Source tag -> normalizer
+_NORMALIZERS = {
+    'amadeus': normalize_amadeus_offer,
+    'serpapi': normalize_serpapi_offer,
+    # ENA scraper data is already in Amadeus-compatible format
+    'ena_scraper': normalize_amadeus_offer,
+    # ANA scraper has its own data format
+    'ANA_Official': normalize_ana_offer,
+}
+
+def _dispatch(raw: dict) -> Offer | None:
+    """Normalize one raw offer; returns None for unknown sources or malformed offers."""
+    source = raw.get('source') or raw.get('_source')  # Handle both 'source' and '_source'
+    normalizer = _NORMALIZERS.get(source)
+    if normalizer is None:
+        logger.warning("Unknown source: %s, skipping offer", source)
+        return None
+    try:
+        return normalizer(raw)
+    except Exception as e:
+        # Skip malformed offers
+        logger.warning("Error normalizing offer from %s: %s", source, e)
+        return None
+
 def normalize_offers(raw_offers: list[dict]) -> list[Offer]:
-    normalized = []
-    for raw in raw_offers:
-        try:
-            source = raw.get('source') or raw.get('_source')  # Handle both 'source' and '_source'
-            if source == 'amadeus':
-                normalized.append(normalize_amadeus_offer(raw))
-            elif source == 'serpapi':
-                normalized.append(normalize_serpapi_offer(raw))
-            elif source == 'ena_scraper':
-                # ENA scraper data is already in Amadeus-compatible format
-                # Just normalize it like Amadeus data
-                normalized.append(normalize_amadeus_offer(raw))
-            elif source == 'ANA_Official':
-                # ANA scraper has its own data format
-                normalized.append(normalize_ana_offer(raw))
-            else:
-                print(f"Unknown source: {source}, skipping offer")
-        except Exception as e:
-            # Skip malformed offers but log in real prod
-            print(f"Error normalizing offer from {raw.get('source') or raw.get('_source')}: {e}")
-            continue
-    return normalized
+    return [o for o in map(_dispatch, raw_offers) if o is not None]
@@ -1,13 +1,200 @@
 import logging
-import time
-from playwright.sync_api import sync_playwright
+import re
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from datetime import datetime
-import json
+import orjson
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.config import get_settings
+from app.core.browser import SCRAPE_EXECUTOR, block_unneeded_resources, get_browser_pool, run_scrape_async
+from app.core.cache import SimpleCache
 
 logger = logging.getLogger(__name__)
 
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Form fill + submit attempts per scrape (retries reuse the page)
+FORM_ATTEMPTS = 2
+
+# Default timeout for page actions and waits without an explicit one
+DEFAULT_TIMEOUT_MS = 8000
+
+# Dropdowns, dialogs and the calendar are stable immediately, so actionability checks pass at once
+_NO_ANIMATIONS_JS = """
+document.addEventListener('DOMContentLoaded', () => {
+    const style = document.createElement('style');
+    style.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; }';
+    document.head.appendChild(style);
+});
+"""
+
+# Airport search box in the departure/arrival dropdown
+# (ANA uses input with placeholder "都市または空港を入力"); only visible matches count
+AIRPORT_INPUT_SELECTOR = (
+    "input[placeholder*='都市'], input[placeholder*='空港'], "
+    "input.be-search-autocomplete__input, div[role='dialog'] input[type='text']"
+    " >> visible=true"
+)
+
+# Click the filtered airport entry in-page, bypassing Playwright's visibility checks
+_AIRPORT_CLICK_JS = """
+(code) => {
+    // Find the list item with matching data-value
+    const item = document.querySelector(`li[data-value="${code}"]`);
+    if (item) {
+        item.click();
+        return 'clicked: ' + item.textContent;
+    }
+    // Fallback: find by text content
+    const items = Array.from(document.querySelectorAll('li.be-list__item'));
+    const match = items.find(el => el.textContent.includes(code));
+    if (match) {
+        match.click();
+        return 'clicked by text: ' + match.textContent;
+    }
+    return 'not found';
+}
+"""
+
+# Text of candidate flight rows: mentions ANA and is not the "到着" header row
+_FLIGHT_ROWS_JS = """
+() => Array.from(document.querySelectorAll('tr'), tr => tr.innerText)
+    .filter(t => t.includes('ANA') && !t.includes('到着'))
+"""
+
+# Row parsing: one pass tags times ("10:00"), flight numbers ("ANA 015") and prices ("34,000").
+# Prices need at least one comma, which skips bare 2-3 digit noise.
+_ROW_RE = re.compile(r"(?P<time>\d{2}:\d{2})|(?P<flight>ANA\s?\d{2,4})|(?P<price>\d{1,3}(?:,\d{3})+)")
+
+ANA_CONFIG_PATH = "scraper_ana_config.json"
+
+DEFAULT_SELECTORS = {
+    "row": "tr.be-flight-list-row", # Hypothetical class, will use broad generic if specific fails
+    "flight_number": ".be-flight-number",
+    "dep_time": ".be-flight-time-dep",
+    "arr_time": ".be-flight-time-arr",
+    "price_flex": "td:has-text('予約変更可')", # Logic will be more complex in loop
+    "price_value": "td:has-text('予約変更不可')" 
+}
+
+# Parsed selectors, reused while the config file's mtime is unchanged
+_CFG_CACHE = {"mtime": None, "data": DEFAULT_SELECTORS}
+
+def _load_selectors() -> dict:
+    """Defaults overlaid with scraper_ana_config.json; re-read only when the file changes."""
+    try:
+        mtime = os.stat(ANA_CONFIG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return DEFAULT_SELECTORS
+
+    if _CFG_CACHE["mtime"] == mtime:
+        return _CFG_CACHE["data"]
+
+    selectors = dict(DEFAULT_SELECTORS)
+    try:
+        with open(ANA_CONFIG_PATH, "rb") as f:
+            selectors.update(orjson.loads(f.read()).get("selectors", {}))
+    except Exception:
+        pass
+    _CFG_CACHE.update(data=selectors, mtime=mtime)  # data first: a concurrent reader at worst re-reads
+    return selectors
+
+# Scrape results per (origin, dest, date, adults, trip_type, flexible_ticket)
+RESULTS_CACHE_TTL = 60
+_results_cache = SimpleCache(maxsize=512)
+
+def _time_matches(dep_time: str, time_range: str) -> bool:
+    """
+    Check an "HH:MM" departure against a time window.
+    Simple logic: "morning" (start < 12), "afternoon" (12-17), "evening" (>17)
+    """
+    dep_h = int(dep_time[:2])
+    if time_range == "morning": return dep_h < 12
+    if time_range == "afternoon": return 12 <= dep_h < 18
+    if time_range == "evening": return dep_h >= 18
+    return False
+
+def _parse_row(text: str, flexible_ticket: bool):
+    """
+    Single scan of a result row for times ("10:00" -> "11:15"), flight number and prices.
+    Returns (flight_num, dep_time, arr_time, price), or None if the row is not a bookable flight.
+
+    Logic for Ticket Type:
+    If user wants "Flexible" (Changeable), we take the highest price, usually the Flex fare.
+    If "Lowest" (Non-changeable), we take the minimum.
+    (This is a simplification; ideally we map column indices)
+    """
+    times = []
+    add_time = times.append
+    flight_num = None
+    final_price = None
+    for m in _ROW_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "time":
+            add_time(m.group())
+        elif kind == "flight":
+            if flight_num is None:
+                flight_num = m.group().replace(" ", "")
+        else:
+            v = int(m.group().replace(",", ""))
+            if v <= 5000: continue  # Filter for real prices (usually > 5000)
+            if final_price is None or (v > final_price if flexible_ticket else v < final_price):
+                final_price = v
+
+    if len(times) < 2 or final_price is None:
+        return None
+    return flight_num or "ANA ???", times[0], times[1], final_price
+
+def _build_offer(origin: str, dest: str, date: str, flight_num: str, dep_time: str, arr_time: str,
+                 price: int, fare_type: str) -> dict:
+    """ANA offer dict (see normalize_ana_offer) for one "HH:MM" -> "HH:MM" flight on date."""
+    return {
+        "source": "ANA_Official",
+        "id": f"ANA_{flight_num}_{dep_time}",
+        "carrier_main": "ANA",
+        "price": price,
+        "currency": "JPY",
+        "segments": [{
+            "departure_iatacode": origin,
+            "arrival_iatacode": dest,
+            "departure_time": f"{date}T{dep_time}:00",
+            "arrival_time": f"{date}T{arr_time}:00",
+            "flight_number": flight_num,
+            "duration": "0h 0m", # Calc if needed
+            "aircraft": "Unknown",
+            "seats_available": 9
+        }],
+        "fare_type": fare_type
+    }
+
+_HHMM_RE = re.compile(r"\d{2}:\d{2}")
+
+def _offer_from_ai(item: dict, origin: str, dest: str, date: str, fare_type: str) -> dict | None:
+    """Offer dict from one extract_flights_from_html item; None if it lacks valid times or a price."""
+    try:
+        dep_time = str(item["departure_time"]).zfill(5)
+        arr_time = str(item["arrival_time"]).zfill(5)
+        price = int(float(str(item["price"]).replace(",", "")))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (_HHMM_RE.fullmatch(dep_time) and _HHMM_RE.fullmatch(arr_time)):
+        return None
+
+    # AI gives the bare number ("123") next to the airline code; ANA rows use "ANA123"
+    number = str(item.get("flight_number") or "").replace(" ", "")
+    flight_num = number if number.startswith("ANA") else f"ANA{number}" if number else "ANA ???"
+    return _build_offer(origin, dest, date, flight_num, dep_time, arr_time, price, fare_type)
+
+# (extract_flights_from_html, save_selector_fix), imported on first AI fallback
+_ai_funcs = None
+
+def _get_ai():
+    """Lazily import the AI helpers (keeps app.core.ai and its clients out of scraper import)."""
+    global _ai_funcs
+    if _ai_funcs is None:
+        from app.core.ai import extract_flights_from_html, save_selector_fix
+        _ai_funcs = (extract_flights_from_html, save_selector_fix)
+    return _ai_funcs
+
 def scrape_ana_flights(origin: str, dest: str, date: str, adults: int = 1, trip_type: str = "oneway", time_range: str = None, flexible_ticket: bool = False, headless: bool = None, auto_close: bool = None):
     """
     Scrape flight data from ANA Official Website.
@@ -24,13 +211,13 @@ def scrape_ana_flights(origin: str, dest: str, date: str, adults: int = 1, trip_
         tuple[list[dict], str | None]: (List of flight offers, Warning message if any)
     """
     # Config defaults from env
-    from app.config import settings
+    settings = get_settings()
     if headless is None:
         headless = settings.SCRAPER_HEADLESS
     if auto_close is None:
         auto_close = settings.SCRAPER_AUTO_CLOSE
 
-    def _run_scraper():
+    def _run_scraper(browser):
         results = []
         warning_msg = None
         
@@ -42,340 +229,257 @@ def scrape_ana_flights(origin: str, dest: str, date: str, adults: int = 1, trip_
         target_date_str = f"{dt.year}年{dt.month}月{dt.day}日" # e.g. 2026年3月3日
         
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=headless)
-                context = browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                )
+            # Fresh context per call on a pooled, already-running browser
+            context = browser.new_context(user_agent=USER_AGENT)
+            block_unneeded_resources(context)
+            try:
                 page = context.new_page()
+                # Fail fast on missing elements; explicit longer timeouts remain for navigation/results
+                page.set_default_timeout(DEFAULT_TIMEOUT_MS)
+                page.add_init_script(_NO_ANIMATIONS_JS)
+                # Routing turns Chromium's HTTP cache off; turn it back on so a form
+                # retry reuses the scripts and styles this context already downloaded
+                try:
+                    context.new_cdp_session(page).send("Network.setCacheDisabled", {"cacheDisabled": False})
+                except Exception as e:
+                    logger.debug("Could not re-enable HTTP cache: %s", e)
                 
-                logger.info(f"Navigating to ANA: {url}")
+                logger.info("Navigating to ANA: %s", url)
                 page.goto(url, timeout=60000)
                 
-                # 1. Open Search Form if needed (Click 'Open' button)
-                try:
-                    open_btn = page.query_selector("button.be-domestic-reserve-ticket-form-open__button")
-                    if open_btn and open_btn.is_visible():
-                        open_btn.click()
-                        time.sleep(1)
-                except:
-                    pass
-
-                # 2. Select Trip Type (One-way or Round-trip)
-                logger.info(f"[DEBUG] Received trip_type parameter: '{trip_type}'")
-                # If user wants round-trip, SKIP clicking "片道" (it defaults to round-trip 往復)
-                # If user wants one-way, we click "片道"
-                if trip_type == "oneway":
-                    logger.info("[TRIP TYPE] User selected ONE-WAY (片道), clicking the button...")
+                def search_form():
+                    """Fill in and submit the search form, then wait for the results."""
+                    # 1. Open Search Form if needed (Click 'Open' button)
                     try:
-                        # Use .first to select the first visible "片道" button (domestic flights)
-                        one_way_btn = page.locator("li.be-switch__item", has_text="片道").first
-                        one_way_btn.click()
-                        time.sleep(0.5)
-                        logger.info("[TRIP TYPE] Successfully selected One-way")
-                    except Exception as e:
-                        logger.warning(f"[TRIP TYPE] Could not select One-way: {e}")
-                else:
-                    logger.info(f"[TRIP TYPE] User selected ROUND-TRIP (往復), skipping '片道' click. Using default.")
-
-                # 3. Helpers for Airport Selection
-                def select_airport(btn_selector, airport_code):
-                    """
-                    Select airport by typing search text first to filter the list.
-                    This matches real user behavior on ANA's website.
-                    """
-                    # Step 1: Click to open dropdown
-                    page.click(btn_selector)
-                    time.sleep(1.5)
+                        open_btn = page.query_selector("button.be-domestic-reserve-ticket-form-open__button")
+                        if open_btn and open_btn.is_visible():
+                            open_btn.click()
+                            page.wait_for_selector("button.be-domestic-reserve-ticket-departure-airport__button", state="visible", timeout=5000)
+                    except:
+                        pass
+
+                    # 2. Select Trip Type (One-way or Round-trip)
+                    logger.info("[DEBUG] Received trip_type parameter: '%s'", trip_type)
+                    # If user wants round-trip, SKIP clicking "片道" (it defaults to round-trip 往復)
+                    # If user wants one-way, we click "片道"
+                    if trip_type == "oneway":
+                        logger.info("[TRIP TYPE] User selected ONE-WAY (片道), clicking the button...")
+                        try:
+                            # Use .first to select the first visible "片道" button (domestic flights)
+                            one_way_btn = page.locator("li.be-switch__item", has_text="片道").first
+                            one_way_btn.click()
+                            logger.info("[TRIP TYPE] Successfully selected One-way")
+                        except Exception as e:
+                            logger.warning("[TRIP TYPE] Could not select One-way: %s", e)
+                    else:
+                        logger.info("[TRIP TYPE] User selected ROUND-TRIP (往復), skipping '片道' click. Using default.")
+
+                    # 3. Helpers for Airport Selection
+                    def select_airport(btn_selector, airport_code):
+                        """
+                        Select airport by typing search text first to filter the list.
+                        This matches real user behavior on ANA's website.
+                        """
+                        # Step 1: Click to open dropdown; the wait hands back the first visible search input
+                        page.click(btn_selector)
+                        try:
+                            search_input = page.wait_for_selector(AIRPORT_INPUT_SELECTOR, timeout=5000)
+                        except PlaywrightTimeoutError:
+                            search_input = None  # Handled by the direct-selection fallback below
                     
-                    try:
-                        # Step 2: Find and type in the search input field
-                        # ANA uses input with placeholder "都市または空港を入力"
-                        search_input_selectors = [
-                            "input[placeholder*='都市']",
-                            "input[placeholder*='空港']",
-                            "input.be-search-autocomplete__input",
-                            "div[role='dialog'] input[type='text']"
-                        ]
-                        
-                        search_input = None
-                        for selector in search_input_selectors:
-                            inputs = page.locator(selector)
-                            if inputs.count() > 0 and inputs.first.is_visible():
-                                search_input = inputs.first
-                                break
-                        
-                        if search_input:
-                            # Clear and type airport code
-                            search_input.fill("")
-                            time.sleep(0.3)
-                            search_input.fill(airport_code)
-                            time.sleep(1.5)  # Wait for autocomplete to filter
-                            logger.info(f"[AIRPORT] Typed '{airport_code}' to filter results")
-                            
-                            # Step 3: Use JavaScript to directly click the element
-                            # This bypasses Playwright's visibility check completely
-                            js_click_script = f"""
-                            () => {{
-                                // Find the list item with matching data-value
-                                const item = document.querySelector('li[data-value="{airport_code}"]');
-                                if (item) {{
-                                    item.click();
-                                    return 'clicked: ' + item.textContent;
-                                }}
-                                // Fallback: find by text content
-                                const items = Array.from(document.querySelectorAll('li.be-list__item'));
-                                const match = items.find(el => el.textContent.includes('{airport_code}'));
-                                if (match) {{
-                                    match.click();
-                                    return 'clicked by text: ' + match.textContent;
-                                }}
-                                return 'not found';
-                            }}
-                            """
+                        try:
+                            if search_input:
+                                # Step 2: Type airport code (fill replaces any existing text)
+                                search_input.fill(airport_code)
+                                # Wait for autocomplete to filter (item may be hidden, so only require it in the DOM)
+                                try:
+                                    page.wait_for_selector(f'li[data-value="{airport_code}"]', state="attached", timeout=5000)
+                                except PlaywrightTimeoutError:
+                                    pass  # Text-match fallback in the click script
+                                logger.info("[AIRPORT] Typed '%s' to filter results", airport_code)
                             
-                            result = page.evaluate(js_click_script)
-                            logger.info(f"[AIRPORT] JavaScript click result: {result}")
-                            time.sleep(0.5)
-                            clicked = True
-                        else:
-                            # No search input - fallback to direct click
-                            logger.warning(f"[AIRPORT] No search input found, using direct selection")
-                            xpath = f"//span[text()='{airport_code}']/ancestor::button | //button[contains(., '{airport_code}')]"
-                            page.locator(xpath).first.click()
+                                # Step 3: Use JavaScript to directly click the element
+                                # This bypasses Playwright's visibility check completely
+                                result = page.evaluate(_AIRPORT_CLICK_JS, airport_code)
+                                logger.info("[AIRPORT] JavaScript click result: %s", result)
+                            else:
+                                # No search input - fallback to direct click
+                                logger.warning("[AIRPORT] No search input found, using direct selection")
+                                xpath = f"//span[text()='{airport_code}']/ancestor::button | //button[contains(., '{airport_code}')]"
+                                page.locator(xpath).first.click()
                             
-                    except Exception as e:
-                        logger.error(f"[AIRPORT] Failed to select {airport_code}: {e}")
-                        raise
+                        except Exception as e:
+                            logger.error("[AIRPORT] Failed to select %s: %s", airport_code, e)
+                            raise
                     
-                    time.sleep(1)
+                        # Selection closes the dropdown
+                        try:
+                            page.wait_for_selector(AIRPORT_INPUT_SELECTOR, state="hidden", timeout=5000)
+                        except PlaywrightTimeoutError:
+                            pass
 
-                # Select Origin
-                select_airport("button.be-domestic-reserve-ticket-departure-airport__button", origin)
+                    # Select Origin
+                    select_airport("button.be-domestic-reserve-ticket-departure-airport__button", origin)
                 
-                # Select Destination
-                select_airport("button.be-domestic-reserve-ticket-arrival-airport__button", dest)
+                    # Select Destination
+                    select_airport("button.be-domestic-reserve-ticket-arrival-airport__button", dest)
 
-                # 4. Select Date
-                page.click("button.be-domestic-reserve-ticket-departure-date__button")
-                time.sleep(2) # Longer wait for calendar to fully load
+                    # 4. Select Date
+                    page.click("button.be-domestic-reserve-ticket-departure-date__button")
+                    page.wait_for_selector("button.be-calendar-month__cell-button", state="visible", timeout=10000)
                 
-                # ANA Calendar Format: aria-label = "2026年2月17日 火曜日" (with weekday in Japanese)
-                # Key insight: Use the calendar-specific button class to avoid matching car rental buttons
-                date_selected = False
-                try:
-                    # Build the date string without weekday (will use contains match)
-                    target_date_base = f"{dt.year}年{dt.month}月{dt.day}日"
-                    logger.info(f"[DATE] Looking for date: {target_date_base} (any weekday)")
+                    # ANA Calendar Format: aria-label = "2026年2月17日 火曜日" (with weekday in Japanese)
+                    # Key insight: Use the calendar-specific button class to avoid matching car rental buttons
+                    date_selected = False
+                    try:
+                        # Build the date string without weekday (will use contains match)
+                        target_date_base = f"{dt.year}年{dt.month}月{dt.day}日"
+                        logger.info("[DATE] Looking for date: %s (any weekday)", target_date_base)
                     
-                    # Strategy: Use the calendar-specific button class and partial aria-label match
-                    # This avoids matching car rental or other date pickers
-                    date_btn = page.locator(
-                        f"button.be-calendar-month__cell-button[aria-label^='{target_date_base}']"
-                    )
+                        # Strategy: Use the calendar-specific button class and partial aria-label match
+                        # This avoids matching car rental or other date pickers
+                        date_btn = page.locator(
+                            f"button.be-calendar-month__cell-button[aria-label^='{target_date_base}']"
+                        )
                     
-                    count = date_btn.count()
-                    logger.info(f"[DATE] Found {count} matching calendar buttons")
+                        count = date_btn.count()
+                        logger.info("[DATE] Found %s matching calendar buttons", count)
                     
-                    if count > 0:
-                        # Check visibility and click the first visible one
-                        for i in range(count):
-                            btn = date_btn.nth(i)
-                            if btn.is_visible():
-                                btn.click()
-                                logger.info(f"[DATE] ✓ Successfully selected date: {target_date_base}")
-                                date_selected = True
-                                break
+                        if count > 0:
+                            # Check visibility and click the first visible one
+                            for i in range(count):
+                                btn = date_btn.nth(i)
+                                if btn.is_visible():
+                                    btn.click()
+                                    logger.info("[DATE] ✓ Successfully selected date: %s", target_date_base)
+                                    date_selected = True
+                                    break
                     
-                    if not date_selected:
-                        logger.error(f"[DATE] ✗ No visible calendar button found for {target_date_base}")
-                        raise Exception(f"Failed to select date {date}. Date button not found or not clickable.")
+                        if not date_selected:
+                            logger.error("[DATE] ✗ No visible calendar button found for %s", target_date_base)
+                            raise Exception(f"Failed to select date {date}. Date button not found or not clickable.")
                     
-                    time.sleep(1)
+                        try:
+                            page.wait_for_selector("button.be-dialog__button--positive", state="visible", timeout=5000)
+                        except PlaywrightTimeoutError:
+                            pass  # Falls through to the generic confirm button / auto-apply below
                     
-                    # Confirm date with the positive button in dialog
-                    confirm_btn = page.locator("button.be-dialog__button--positive", has_text="決定")
-                    if confirm_btn.count() > 0:
-                        confirm_btn.click()
-                        time.sleep(1)
-                        logger.info("[DATE] ✓ Date confirmed with dialog button")
-                    else:
-                        # Fallback to generic text match
-                        confirm_btn_fallback = page.locator("button", has_text="決定")
-                        if confirm_btn_fallback.count() > 0:
-                            confirm_btn_fallback.first.click()
-                            time.sleep(1)
-                            logger.info("[DATE] ✓ Date confirmed with fallback button")
+                        # Confirm date with the positive button in dialog
+                        confirm_btn = page.locator("button.be-dialog__button--positive", has_text="決定")
+                        if confirm_btn.count() > 0:
+                            confirm_btn.click()
+                            logger.info("[DATE] ✓ Date confirmed with dialog button")
                         else:
-                            logger.warning("[DATE] ⚠️ No confirm button found, date might auto-apply")
+                            # Fallback to generic text match
+                            confirm_btn_fallback = page.locator("button", has_text="決定")
+                            if confirm_btn_fallback.count() > 0:
+                                confirm_btn_fallback.first.click()
+                                logger.info("[DATE] ✓ Date confirmed with fallback button")
+                            else:
+                                logger.warning("[DATE] ⚠️ No confirm button found, date might auto-apply")
                         
-                except Exception as e:
-                    logger.error(f"Date selection failed: {e}")
-                    raise  # Re-raise to stop scraping with wrong date
+                    except Exception as e:
+                        logger.error("Date selection failed: %s", e)
+                        raise  # Re-raise to stop scraping with wrong date
 
-                # 5. Submit Search
-                # Use more specific selector to avoid matching disabled button
-                search_btn = page.locator("button.be-domestic-reserve-ticket-submit__button:not([disabled])").first
-                search_btn.click()
+                    # 5. Submit Search
+                    # Use more specific selector to avoid matching disabled button
+                    search_btn = page.locator("button.be-domestic-reserve-ticket-submit__button:not([disabled])").first
+                    search_btn.click()
                 
-                logger.info("Search submitted, waiting for results...")
-                page.wait_for_selector("div.be-flight-list, table", timeout=30000) # Generic wait
-                time.sleep(3) # Extra wait for dynamic loading
+                    logger.info("Search submitted, waiting for results...")
+                    page.wait_for_selector("div.be-flight-list, table", timeout=30000) # Generic wait
+                    # Let the remaining result requests settle instead of a fixed extra wait
+                    try:
+                        page.wait_for_load_state("networkidle", timeout=10000)
+                    except PlaywrightTimeoutError:
+                        logger.debug("Results page not network-idle after 10s, parsing anyway")
+
+                # A failed form step is retried once on the same page; reloading the form
+                # (without waiting for the full load event) is far cheaper than a new context
+                for attempt in range(FORM_ATTEMPTS):
+                    try:
+                        search_form()
+                        break
+                    except Exception as e:
+                        if attempt == FORM_ATTEMPTS - 1:
+                            raise
+                        logger.warning("ANA search form failed (%s), retrying on the same page", e)
+                        page.goto(url, wait_until="domcontentloaded", timeout=60000)
 
                     
                 # 6. Parse Results
                 # Load ANA specific selectors
-                config_path = "scraper_ana_config.json"
-                selectors = {
-                    "row": "tr.be-flight-list-row", # Hypothetical class, will use broad generic if specific fails
-                    "flight_number": ".be-flight-number",
-                    "dep_time": ".be-flight-time-dep",
-                    "arr_time": ".be-flight-time-arr",
-                    "price_flex": "td:has-text('予約変更可')", # Logic will be more complex in loop
-                    "price_value": "td:has-text('予約変更不可')" 
-                }
-                if os.path.exists(config_path):
-                    try:
-                        with open(config_path, "r") as f:
-                            selectors.update(json.load(f).get("selectors", {}))
-                    except: pass
+                selectors = _load_selectors()
 
                 # ANA structure usually: Table with rows. 
                 # We'll select all rows that look like flights.
                 # Using a more generic approach relying on text content for robustness against class changes.
-                flight_rows = page.query_selector_all("tr")
-                logger.info(f"Processing {len(flight_rows)} rows...")
+                # One evaluate returns the text of flight rows only; header and
+                # non-flight rows are dropped in the page instead of shipped to Python
+                row_texts = page.evaluate(_FLIGHT_ROWS_JS)
+                logger.info("Processing %d rows...", len(row_texts))
 
-                for row in flight_rows:
-                    try:
-                        text = row.inner_text()
-                        if "ANA" not in text or "到着" in text: continue # Header or invalid row
-
-                        # Extract basic info
-                        # Need to parse "10:00" -> "11:15" patterns
-                        import re
-                        times = re.findall(r"(\d{2}:\d{2})", text)
-                        if len(times) < 2: continue
-                        dep_time = times[0]
-                        arr_time = times[1]
-
-                        # Flight Number (e.g., ANA 015)
-                        flight_num = "ANA ???"
-                        fn_match = re.search(r"(ANA\s?\d{2,4})", text)
-                        if fn_match:
-                            flight_num = fn_match.group(1).replace(" ", "")
-
-                        # Extract Prices
-                        # We need to find the specific "Flexible" vs "Value" columns.
-                        # Best way: Check the column index or label within the row.
-                        
-                        # Simple heuristic:
-                        # value_price = lowest price found in row
-                        # flexible_price = price associated with "Changeable" label
-                        
-                        prices = []
-                        # Find all price texts like "34,000"
-                        price_matches = re.findall(r"(\d{1,3}(?:,\d{3})*)", text)
-                        # Filter for real prices (usually > 5000)
-                        valid_prices = []
-                        for p in price_matches:
-                            v = int(p.replace(",", ""))
-                            if v > 5000: valid_prices.append(v)
-                        
-                        if not valid_prices: continue
-                        
-                        # Logic for Ticket Type
-                        # If user wants "Flexible" (Changeable), we try to find the higher price usually associated with Flex
-                        # If "Lowest" (Non-changeable), we take the minimum.
-                        
-                        final_price = min(valid_prices) # Default to lowest
-                        fare_type = "Value"
-                        
-                        if flexible_ticket:
-                            # Try to find max or specific column
-                            # For MVP, we assume the highest valid price in the row is the Flex fare
-                            # (This is a simplification; ideally we map column indices)
-                            final_price = max(valid_prices)
-                            fare_type = "Flex"
-
-                        # --- Time Filtering ---
-                        if time_range:
-                            # Simple logic: "morning" (start < 12), "afternoon" (12-17), "evening" (>17)
-                            dep_h = int(dep_time.split(":")[0])
-                            matched_time = False
-                            if time_range == "morning" and dep_h < 12: matched_time = True
-                            elif time_range == "afternoon" and 12 <= dep_h < 18: matched_time = True
-                            elif time_range == "evening" and dep_h >= 18: matched_time = True
-                            
-                            if not matched_time: continue
-                        # ----------------------
-
-                        offer = {
-                            "source": "ANA_Official",
-                            "id": f"ANA_{flight_num}_{dep_time}",
-                            "carrier_main": "ANA",
-                            "price": final_price,
-                            "currency": "JPY",
-                            "segments": [{
-                                "departure_iatacode": origin,
-                                "arrival_iatacode": dest,
-                                "departure_time": f"{date}T{dep_time}:00",
-                                "arrival_time": f"{date}T{arr_time}:00",
-                                "flight_number": flight_num,
-                                "duration": "0h 0m", # Calc if needed
-                                "aircraft": "Unknown",
-                                "seats_available": 9
-                            }],
-                            "fare_type": fare_type
-                        }
-                        results.append(offer)
-
-                    except Exception as e:
-                        logger.debug(f"Row parse error: {e}")
-                        continue
+                fare_type = "Flex" if flexible_ticket else "Value"
+                results = [
+                    _build_offer(origin, dest, date, flight_num, dep_time, arr_time, price, fare_type)
+                    for flight_num, dep_time, arr_time, price in filter(None, (_parse_row(t, flexible_ticket) for t in row_texts))
+                ]
 
                 # --- AI FALLBACK ---
                 if not results:
                     logger.warning("Standard scraping returned 0 results. Triggering AI Fallback...")
                     html_content = page.content()
-                    from app.core.ai import extract_flights_from_html, generate_json_selector_fix
+                    extract_flights_from_html, save_selector_fix = _get_ai()
                     
                     # Use AI to parse the complex table
                     ai_results = extract_flights_from_html(html_content, origin, dest, date)
                     if ai_results:
-                        logger.info(f"AI extracted {len(ai_results)} flights from ANA page.")
+                        logger.info("AI extracted %d flights from ANA page.", len(ai_results))
                         
-                        # Generate Config Fix
-                        try:
-                            suggestion = generate_json_selector_fix(html_content, ai_results)
-                            if suggestion:
-                                with open("scraper_ana_config_suggestion.json", "w") as f:
-                                    json.dump(suggestion, f, indent=2)
-                                warning_msg = "ANA Scraper: Selectors updated by AI! Check Settings."
-                        except: pass
+                        # Generate Config Fix in the background; the AI results are returned right away
+                        SCRAPE_EXECUTOR.submit(save_selector_fix, html_content, ai_results, "scraper_ana_config_suggestion.json")
+                        warning_msg = "ANA Scraper: Selectors failed; AI is preparing a fix. Check Settings shortly."
                         
-                        # Convert AI results to Offer format
-                        for f in ai_results:
-                             # normalize...
-                             pass
-                             # Append to results
-                             
-                        if time_range:
-                            # Filter AI results...
-                            pass
+                        # Convert AI results to Offer format (time_range is applied with the
+                        # standard results, after the cache)
+                        results = [
+                            offer for offer in (_offer_from_ai(f, origin, dest, date, fare_type) for f in ai_results)
+                            if offer is not None
+                        ]
                     else:
                         logger.warning("AI Fallback failed.")
-                
-                if auto_close: browser.close()
+            finally:
+                # Only the context is closed; the browser stays warm for the next call
+                if auto_close: context.close()
 
-                    
         except Exception as e:
-            logger.error(f"ANA Scraper Error: {e}")
+            logger.error("ANA Scraper Error: %s", e)
             warning_msg = f"Scraper Error: {e}"
 
         return results, warning_msg
 
-    # Run in thread pool to avoid asyncio conflicts
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(_run_scraper)
-        return future.result()
+    # Results don't depend on time_range: it is applied after the cache,
+    # so every time window of a route shares one scrape
+    cache_key = (origin, dest, date, adults, trip_type, flexible_ticket)
+    results = _results_cache.get(cache_key)
+    if results is not None:
+        logger.info("ANA cache hit for %s->%s %s", origin, dest, date)
+        warning_msg = None
+    else:
+        # Run on a pooled browser's thread (also keeps sync Playwright away from the asyncio loop)
+        results, warning_msg = get_browser_pool().run(_run_scraper, headless)
+        # Only clean, non-empty scrapes are cached; errors and AI-fallback runs retry next time
+        if results and warning_msg is None:
+            _results_cache.set(cache_key, results, ttl_seconds=RESULTS_CACHE_TTL)
+
+    # --- Time Filtering ---
+    if time_range:
+        results = [o for o in results if _time_matches(o["segments"][0]["departure_time"][11:16], time_range)]
+    else:
+        results = list(results)  # Callers get their own list, never the cached one
+    return results, warning_msg
+
+async def scrape_ana_flights_async(origin: str, dest: str, date: str, **kwargs):
+    """Awaitable scrape_ana_flights for use from the event loop."""
+    return await run_scrape_async(scrape_ana_flights, origin, dest, date, **kwargs)
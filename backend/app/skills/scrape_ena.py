@@ -3,12 +3,122 @@ ENA Travel Web Scraper
 Scrapes flight data from kokunai.ena.travel
 """
 import logging
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
-from datetime import datetime
+import orjson
+import os
+import threading
+import time
+from dataclasses import dataclass
+from playwright.sync_api import TimeoutError as PlaywrightTimeout
+from datetime import datetime, timedelta
 import re
+from app.config import get_settings
+from app.core.browser import SCRAPE_EXECUTOR, block_unneeded_resources, get_browser_pool, run_scrape_async
 
 logger = logging.getLogger(__name__)
 
+SCRAPER_CONFIG_PATH = "scraper_config.json"
+SCRAPER_SUGGESTION_PATH = "scraper_config_suggestion.json"
+
+DEFAULT_SELECTORS = {
+    "container": "a#add_cart",
+    "flight_number": "li:nth-child(1) p:nth-child(2)",
+    "departure_time": "li:nth-child(2) p:first-child",
+    "arrival_time": "li:nth-child(4) p:first-child",
+    "price": "li:nth-child(7) p"
+}
+
+# Parsed selectors, reused while the config file's mtime is unchanged
+_CONFIG_CACHE = {"mtime": None, "selectors": DEFAULT_SELECTORS}
+
+def _get_selectors() -> dict:
+    """Defaults overlaid with scraper_config.json; re-read only when the file changes."""
+    try:
+        mtime = os.stat(SCRAPER_CONFIG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return DEFAULT_SELECTORS
+
+    if _CONFIG_CACHE["mtime"] == mtime:
+        return _CONFIG_CACHE["selectors"]
+
+    selectors = dict(DEFAULT_SELECTORS)
+    try:
+        with open(SCRAPER_CONFIG_PATH, "rb") as f:
+            selectors.update(orjson.loads(f.read()).get("selectors", {}))
+        logger.info("Loaded dynamic selectors from config")
+    except Exception as e:
+        logger.error("Failed to load config: %s", e)
+    _CONFIG_CACHE.update(selectors=selectors, mtime=mtime)  # selectors first: a concurrent reader at worst re-reads
+    return selectors
+
+# Characters dropped from price texts like "12,800円"
+_PRICE_TRANS = str.maketrans({',': None, '円': None, '¥': None, ' ': None, '\t': None, '\n': None})
+# "NH123" / "NH 123" -> ("NH", "123")
+_FLIGHT_NUM_RE = re.compile(r'([A-Z]{2})\s?(\d+)')
+
+# Minimum gap between ENA page loads, so concurrent scrapes don't hit the site all at once
+NAVIGATION_STAGGER_SECONDS = 0.1
+_next_navigation_at = 0.0
+_navigation_lock = threading.Lock()
+
+# One row per container element, read in a single evaluate (instead of a
+# query_selector + inner_text round-trip per field per flight); takes the
+# selectors dict as its argument. A field whose element is missing comes back as null.
+_EXTRACT_JS = """(sel) => Array.from(document.querySelectorAll(sel.container), el => {
+    const text = (s) => el.querySelector(s)?.innerText?.trim() ?? null;
+    return {fn: text(sel.flight_number), dep: text(sel.departure_time), arr: text(sel.arrival_time), price: text(sel.price)};
+})"""
+
+# Resolves once the result rows have stopped arriving: at least one row, and the
+# same count on two consecutive polls (rows render progressively)
+_ROWS_STABLE_JS = """(container) => {
+    const n = document.querySelectorAll(container).length;
+    const stable = n > 0 && n === window.__enaRowCount;
+    window.__enaRowCount = n;
+    return stable;
+}"""
+ROWS_POLL_MS = 250
+
+# Upper bound for keeping a debug window open (SCRAPER_AUTO_CLOSE=false)
+INSPECTION_TIMEOUT_MS = 60000
+
+def _stagger_navigation():
+    """Reserve the next navigation slot and sleep until it (no-op when ENA is idle)."""
+    global _next_navigation_at
+    with _navigation_lock:
+        now = time.monotonic()
+        start_at = max(now, _next_navigation_at)
+        _next_navigation_at = start_at + NAVIGATION_STAGGER_SECONDS
+    if start_at > now:
+        time.sleep(start_at - now)
+
+@dataclass(slots=True, frozen=True)
+class FlightRow:
+    """One scraped flight, as consumed by build_amadeus_format"""
+    id: str
+    airline: str
+    flight_number: str
+    departure_time: str  # "HH:MM"
+    arrival_time: str    # "HH:MM"
+    price: float
+    origin: str
+    destination: str
+    date: str
+
+    @classmethod
+    def from_ai(cls, f: dict) -> "FlightRow":
+        """Build from a flight dict returned by extract_flights_from_html"""
+        return cls(
+            id=f['id'],
+            airline=f.get('airline') or "NH",
+            flight_number=str(f['flight_number']),
+            departure_time=f['departure_time'],
+            arrival_time=f['arrival_time'],
+            price=float(f['price']),
+            origin=f['origin'],
+            destination=f['destination'],
+            date=f['date'],
+        )
+
 def scrape_ena_flights(origin: str, dest: str, date: str, adults: int = 1, headless: bool = None, auto_close: bool = None):
     """
     Scrape flight offers from ENA Travel website
@@ -24,8 +134,7 @@ def scrape_ena_flights(origin: str, dest: str, date: str, adults: int = 1, headl
     Returns:
         List of flight offer dictionaries compatible with Amadeus format
     """
-    import concurrent.futures
-    from app.config import settings
+    settings = get_settings()
     
     # Use config defaults if not specified
     if headless is None:
@@ -33,10 +142,10 @@ def scrape_ena_flights(origin: str, dest: str, date: str, adults: int = 1, headl
     if auto_close is None:
         auto_close = settings.SCRAPER_AUTO_CLOSE
     
-    logger.info(f"Scraper settings: headless={headless}, auto_close={auto_close}")
+    logger.info("Scraper settings: headless=%s, auto_close=%s", headless, auto_close)
     
-    def _run_scraper():
-        """Inner function to run scraper in separate thread"""
+    def _run_scraper(browser):
+        """Inner function, run on a pooled browser's thread"""
         results = []
         warning_msg = None
         
@@ -46,218 +155,203 @@ def scrape_ena_flights(origin: str, dest: str, date: str, adults: int = 1, headl
         # Build URL
         url = f"https://kokunai.ena.travel/internalairsearch?route={origin}-{dest}-{date_formatted}-nondirect&adt={adults}&chd=0&inf=0&airline=NH"
         
-        logger.info(f"Scraping ENA Travel: {url}")
+        logger.info("Scraping ENA Travel: %s", url)
         
         try:
-            with sync_playwright() as p:
-                # Launch browser (headless or visible based on parameter)
-                browser = p.chromium.launch(headless=headless)
-                page = browser.new_page()
+            # Fresh context per call on a pooled, already-running browser
+            context = browser.new_context()
+            block_unneeded_resources(context)
+            try:
+                page = context.new_page()
                 
                 # Navigate to search page
-                page.goto(url, timeout=30000)
+                _stagger_navigation()
+                # Results are rendered by scripts; no need to wait for the full load event
+                page.goto(url, wait_until="domcontentloaded", timeout=30000)
                 
-                # Wait for flight results to load
+                # Load selectors from config
+                selectors = _get_selectors()
+                
+                # Wait for flight results to finish loading
                 try:
-                    page.wait_for_selector('a#add_cart', timeout=15000)
+                    page.wait_for_function(_ROWS_STABLE_JS, arg=selectors["container"], timeout=15000, polling=ROWS_POLL_MS)
                     logger.info("Flight results loaded successfully")
                 except PlaywrightTimeout:
-                    logger.warning("Timeout waiting for flight results selector")
-                    browser.close()
-                    return results
-                
-                # Load selectors from config
-                import json
-                import os
+                    # Maybe no flights, maybe a stale container selector: extract whatever
+                    # matches and let the AI fallback below handle an empty result
+                    logger.warning("Timeout waiting for flight results selector '%s'", selectors["container"])
                 
-                config_path = "scraper_config.json"
-                selectors = {
-                    "container": "a#add_cart",
-                    "flight_number": "li:nth-child(1) p:nth-child(2)",
-                    "departure_time": "li:nth-child(2) p:first-child",
-                    "arrival_time": "li:nth-child(4) p:first-child",
-                    "price": "li:nth-child(7) p"
-                }
-                
-                if os.path.exists(config_path):
-                    try:
-                        with open(config_path, "r") as f:
-                            saved_config = json.load(f)
-                            selectors.update(saved_config.get("selectors", {}))
-                            logger.info("Loaded dynamic selectors from config")
-                    except Exception as e:
-                        logger.error(f"Failed to load config: {e}")
-                
-                # Extract flight data using DYNAMIC selectors
-                flight_links = page.query_selector_all(selectors["container"])
+                # Extract flight data using DYNAMIC selectors, all in one evaluate
+                flight_rows = page.evaluate(_EXTRACT_JS, selectors)
                 
                 # --- AI FALLBACK CHECK ---
-                if not flight_links:
-                    logger.warning(f"No flight links found with selector '{selectors['container']}'. Attempting AI Fallback...")
+                if not flight_rows:
+                    logger.warning("No flight links found with selector '%s'. Attempting AI Fallback...", selectors['container'])
                     # Get page content for AI
                     html_content = page.content()
                     from app.core.ai import extract_flights_from_html
                     
                     ai_results = extract_flights_from_html(html_content, origin, dest, date)
                     if ai_results:
-                        logger.info(f"AI saved the day! Found {len(ai_results)} flights.")
+                        logger.info("AI saved the day! Found %d flights.", len(ai_results))
                         
                         # --- SELF-HEALING: GENERATE FIX SUGGESTION (JSON) ---
+                        # Runs in the background; the extracted flights are returned right away
                         logger.warning("⚠️ ALERT: Selectors failed. generating JSON config suggestion...")
-                        try:
-                            from app.core.ai import generate_json_selector_fix
-                            suggestion_json = generate_json_selector_fix(html_content, ai_results)
-                            if suggestion_json:
-                                fix_file = "scraper_config_suggestion.json"
-                                with open(fix_file, "w") as f:
-                                    json.dump(suggestion_json, f, indent=2)
-                                logger.warning(f"✅ Config suggestion saved to {fix_file}")
-                                warning_msg = "Selectors updated by AI! Check Settings."
-                        except Exception as e:
-                            logger.error(f"Self-healing generation failed: {e}")
+                        from app.core.ai import save_selector_fix
+                        SCRAPE_EXECUTOR.submit(save_selector_fix, html_content, ai_results, SCRAPER_SUGGESTION_PATH)
+                        warning_msg = "Selectors failed; AI is preparing a fix. Check Settings shortly."
                         # ---------------------------------------------
 
                         for f in ai_results:
-                            amadeus_format = build_amadeus_format(f, date)
+                            amadeus_format = build_amadeus_format(FlightRow.from_ai(f), date)
                             results.append(amadeus_format)
                         
-                        if auto_close: browser.close()
                         return results, warning_msg
                     else:
                         logger.warning("AI Fallback also failed.")
                 # -------------------------
                 
-                logger.info(f"Found {len(flight_links)} flight results")
+                logger.info("Found %d flight results", len(flight_rows))
                 
-                for idx, link in enumerate(flight_links):
+                for idx, row in enumerate(flight_rows):
                     try:
-                        # Extract data using dynamic selectors
-                        flight_number_elem = link.query_selector(selectors["flight_number"])
-                        dep_time_elem = link.query_selector(selectors["departure_time"])
-                        arr_time_elem = link.query_selector(selectors["arrival_time"])
-                        price_elem = link.query_selector(selectors["price"])
+                        flight_number = row["fn"]
+                        dep_time = row["dep"]
+                        arr_time = row["arr"]
+                        price_text = row["price"]
                         
-                        if not all([flight_number_elem, dep_time_elem, arr_time_elem, price_elem]):
-                            logger.warning(f"Skipping flight {idx}: missing elements")
+                        if None in (flight_number, dep_time, arr_time, price_text):
+                            logger.warning("Skipping flight %s: missing elements", idx)
                             continue
                         
-                        flight_number = flight_number_elem.inner_text().strip()
-                        dep_time = dep_time_elem.inner_text().strip()
-                        arr_time = arr_time_elem.inner_text().strip()
-                        price_text = price_elem.inner_text().strip()
-                        
-                        # Parse price (remove commas and 円)
-                        price_clean = price_text.replace(',', '').replace('円', '').strip()
-                        price =float(price_clean) if price_clean else 0
+                        # Parse price (remove commas, 円/¥ and whitespace in one pass)
+                        price_clean = price_text.translate(_PRICE_TRANS)
+                        price = float(price_clean) if price_clean else 0
                         
                         # Extract airline code (usually first 2 letters of flight number)
-                        airline_code = flight_number[:2] if len(flight_number) >= 2 else "NH"
-                        flight_num = flight_number[2:] if len(flight_number) > 2 else flight_number
+                        fn_match = _FLIGHT_NUM_RE.fullmatch(flight_number)
+                        if fn_match:
+                            airline_code, flight_num = fn_match.groups()
+                        else:
+                            airline_code = flight_number[:2] if len(flight_number) >= 2 else "NH"
+                            flight_num = flight_number[2:] if len(flight_number) > 2 else flight_number
                         
                         # Build flight data
-                        flight_data = {
-                            "id": f"ENA_{idx+1}_{flight_number}",
-                            "airline": airline_code,
-                            "flight_number": flight_num,
-                            "departure_time": dep_time,
-                            "arrival_time": arr_time,
-                            "price": price,
-                            "origin": origin,
-                            "destination": dest,
-                            "date": date
-                        }
+                        flight_data = FlightRow(
+                            id=f"ENA_{idx+1}_{flight_number}",
+                            airline=airline_code,
+                            flight_number=flight_num,
+                            departure_time=dep_time,
+                            arrival_time=arr_time,
+                            price=price,
+                            origin=origin,
+                            destination=dest,
+                            date=date
+                        )
                         
                         # Convert to Amadeus-compatible format
                         amadeus_format = build_amadeus_format(flight_data, date)
                         results.append(amadeus_format)
                         
                     except Exception as e:
-                        logger.error(f"Error parsing flight {idx}: {e}")
+                        logger.error("Error parsing flight %s: %s", idx, e)
                         continue
                 
                 # Keep browser open for a few seconds so user can see it
-                import time
                 if not headless:
                     logger.info("Keeping browser open for 3 seconds for visibility...")
                     time.sleep(3)
                 
-                # Close browser if auto_close is enabled, otherwise keep it open longer
-                if auto_close:
-                    browser.close()
-                    logger.info("Browser closed")
-                else:
+                # Debug only: keep a visible window open for inspection until the
+                # user closes it (at most INSPECTION_TIMEOUT_MS). Headless or
+                # non-debug runs return straight away.
+                if not auto_close and not headless and settings.DEBUG:
                     logger.info("Browser left open (SCRAPER_AUTO_CLOSE=false)")
-                    logger.info("Browser will remain open for 60 seconds before auto-closing...")
-                    logger.info("You can manually close the browser window or press Ctrl+C to stop")
-                    # Keep browser open for 60 seconds for inspection
-                    time.sleep(60)
-                    browser.close()
-                    logger.info("Browser auto-closed after 60 seconds")
+                    logger.info("Close the browser tab to continue (auto-closes after 60 seconds)")
+                    try:
+                        page.wait_for_event("close", timeout=INSPECTION_TIMEOUT_MS)
+                    except PlaywrightTimeout:
+                        pass
+            finally:
+                # Only the context is closed; the browser stays warm for the next call
+                context.close()
                 
         except Exception as e:
-            logger.error(f"ENA scraping error: {e}")
+            logger.error("ENA scraping error: %s", e)
             # Optional: Add emergency HTML dump or AI rescue here if browser crashed
         
-        logger.info(f"Successfully scraped {len(results)} flights from ENA Travel")
+        logger.info("Successfully scraped %d flights from ENA Travel", len(results))
         return results, warning_msg
     
-    # Run scraper in thread pool to avoid asyncio conflicts
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(_run_scraper)
-        return future.result()
+    # Run on a pooled browser's thread (also keeps sync Playwright away from the asyncio loop)
+    return get_browser_pool().run(_run_scraper, headless)
 
 
-def build_amadeus_format(flight_data: dict, date: str) -> dict:
+async def scrape_ena_flights_async(origin: str, dest: str, date: str, **kwargs):
+    """Awaitable scrape_ena_flights; concurrent calls scrape on separate pooled browsers."""
+    return await run_scrape_async(scrape_ena_flights, origin, dest, date, **kwargs)
+
+# Parts of the Amadeus format ENA doesn't provide; shared by every row (treat as read-only)
+_STATIC_AIRCRAFT = {"code": "738"}  # Default, could be extracted if available
+_STATIC_TRAVELER_PRICINGS = [{
+    "fareDetailsBySegment": [{
+        "cabin": "ECONOMY"  # Default
+    }]
+}]
+
+def build_amadeus_format(flight_data: FlightRow, date: str) -> dict:
     """
     Convert scraped flight data to Amadeus-compatible format
     """
     # Parse times and build ISO datetime strings
-    dep_time = flight_data['departure_time']  # e.g., "07:10"
-    arr_time = flight_data['arrival_time']    # e.g., "08:35"
+    dep_time = flight_data.departure_time  # e.g., "07:10"
+    arr_time = flight_data.arrival_time    # e.g., "08:35"
     
-    dep_datetime = f"{date}T{dep_time}:00"
-    arr_datetime = f"{date}T{arr_time}:00"
+    # Calculate duration in minutes ("H:MM" or "HH:MM": minutes are always the last two chars)
+    dep_mins = int(dep_time[:-3]) * 60 + int(dep_time[-2:])
+    arr_mins = int(arr_time[:-3]) * 60 + int(arr_time[-2:])
+    duration_mins = arr_mins - dep_mins
     
-    # Calculate duration in minutes
-    dep_h, dep_m = map(int, dep_time.split(':'))
-    arr_h, arr_m = map(int, arr_time.split(':'))
-    duration_mins = (arr_h * 60 + arr_m) - (dep_h * 60 + dep_m)
+    # ISO needs zero-padded hours ("7:05" -> "07:05")
+    dep_datetime = f"{date}T{dep_time.rjust(5, '0')}:00"
+    arr_date = date
+    if duration_mins < 0:
+        # Arrives after midnight
+        duration_mins += 1440
+        arr_date = (datetime.fromisoformat(date) + timedelta(days=1)).strftime("%Y-%m-%d")
+    arr_datetime = f"{arr_date}T{arr_time.rjust(5, '0')}:00"
     
     # Format as ISO 8601 duration
-    hours = duration_mins // 60
-    minutes = duration_mins % 60
+    hours, minutes = divmod(duration_mins, 60)
     duration_str = f"PT{hours}H{minutes}M"
     
     return {
         "_source": "ena_scraper",
-        "id": flight_data['id'],
+        "id": flight_data.id,
         "type": "flight-offer",
         "price": {
-            "total": str(flight_data['price']),
+            "total": str(flight_data.price),
             "currency": "JPY"
         },
-        "validatingAirlineCodes": [flight_data['airline']],
+        "validatingAirlineCodes": [flight_data.airline],
         "itineraries": [{
             "duration": duration_str,
             "segments": [{
                 "departure": {
-                    "iataCode": flight_data['origin'],
+                    "iataCode": flight_data.origin,
                     "at": dep_datetime
                 },
                 "arrival": {
-                    "iataCode": flight_data['destination'],
+                    "iataCode": flight_data.destination,
                     "at": arr_datetime
                 },
-                "carrierCode": flight_data['airline'],
-                "number": flight_data['flight_number'],
+                "carrierCode": flight_data.airline,
+                "number": flight_data.flight_number,
                 "duration": duration_str,
-                "aircraft": {"code": "738"}  # Default, could be extracted if available
+                "aircraft": _STATIC_AIRCRAFT
             }]
         }],
         "numberOfBookableSeats": 9,  # Default, not available from ENA page
-        "travelerPricings": [{
-            "fareDetailsBySegment": [{
-                "cabin": "ECONOMY"  # Default
-            }]
-        }]
+        "travelerPricings": _STATIC_TRAVELER_PRICINGS
     }
@@ -1,24 +1,152 @@
-from amadeus import Client, ResponseError
-from app.config import settings
-from serpapi import GoogleSearch
+from app.config import get_settings
+from app.core.cache import SimpleCache
+import asyncio
+import httpx
 import logging
+import orjson
+import re
+import sys
+import time
+import weakref
+from dataclasses import dataclass, field
+from types import MappingProxyType
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Amadeus Client
-try:
-    amadeus = Client(
-        client_id=settings.AMADEUS_CLIENT_ID,
-        client_secret=settings.AMADEUS_CLIENT_SECRET,
-        hostname=settings.AMADEUS_HOSTNAME
+# Flight searches go straight to the providers' HTTP APIs on one pooled async
+# client, so repeat searches reuse open TLS connections and providers run concurrently
+SERPAPI_URL = "https://serpapi.com/search"
+AMADEUS_BASE_URLS = {"test": "https://test.api.amadeus.com", "production": "https://api.amadeus.com"}
+# httpx logs each request URL at INFO, which would include the SerpApi api_key
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# In-flight request caps per provider: bursts queue here rather than at the
+# provider, where they would come back as 429s
+SERPAPI_MAX_CONCURRENCY = 10
+AMADEUS_MAX_CONCURRENCY = 5
+
+@dataclass(slots=True)
+class _LoopState:
+    """
+    The async objects the provider calls share. Clients, semaphores, locks and
+    tasks belong to the event loop they were first used on, so each running
+    loop gets its own set (the server has one; scripts calling asyncio.run()
+    repeatedly get a fresh one per run).
+    """
+    http: httpx.AsyncClient = field(default_factory=lambda: httpx.AsyncClient(
+        timeout=15.0, limits=httpx.Limits(max_keepalive_connections=20)))
+    serpapi_sem: asyncio.Semaphore = field(default_factory=lambda: asyncio.Semaphore(SERPAPI_MAX_CONCURRENCY))
+    amadeus_sem: asyncio.Semaphore = field(default_factory=lambda: asyncio.Semaphore(AMADEUS_MAX_CONCURRENCY))
+    # One Amadeus token refresh at a time: concurrent callers wait for it instead of each fetching a token
+    token_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Lookups currently in flight: keyword -> task. Concurrent requests for the same
+    # unknown city await the one task instead of each calling the API.
+    inflight_lookups: dict[str, asyncio.Task] = field(default_factory=dict)
+
+# Dropped with their loop once it is garbage collected
+_LOOP_STATES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+def _loop_state() -> _LoopState:
+    """The running loop's _LoopState, created on first use."""
+    loop = asyncio.get_running_loop()
+    state = _LOOP_STATES.get(loop)
+    if state is None:
+        state = _LOOP_STATES[loop] = _LoopState()
+    return state
+
+async def close_http_client():
+    """Close the running loop's pooled provider client (called on app shutdown)."""
+    state = _LOOP_STATES.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.http.aclose()
+
+RETRY_STATUSES = frozenset({429, 503})
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+async def _provider_request(provider: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request under the provider's ("serpapi" / "amadeus") concurrency cap.
+    429/503 responses are retried with exponential backoff (or the server's
+    Retry-After, if longer); other error statuses raise.
+    """
+    state = _loop_state()
+    semaphore = state.serpapi_sem if provider == "serpapi" else state.amadeus_sem
+    for attempt in range(MAX_RETRIES + 1):
+        async with semaphore:
+            response = await state.http.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            break
+        delay = RETRY_BASE_DELAY * 2 ** attempt
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        delay = min(delay, RETRY_MAX_DELAY)
+        logger.warning("%s returned %d, retrying in %.1fs", response.url.host, response.status_code, delay)
+        # Sleep outside the semaphore so other requests can use the slot
+        await asyncio.sleep(delay)
+    if response.is_error:
+        # Like raise_for_status(), but without the query string: it can hold the SerpApi api_key
+        raise httpx.HTTPStatusError(
+            f"HTTP {response.status_code} from {response.url.host}{response.url.path}",
+            request=response.request, response=response
+        )
+    return response
+
+# (access token, monotonic expiry); Amadeus tokens live ~30 min, refreshed 60s early.
+# Plain data, so shared by every loop; only the refresh lock is per loop.
+_amadeus_token: tuple[str, float] | None = None
+
+async def _amadeus_access_token() -> str:
+    """OAuth2 client-credentials token, reused until shortly before it expires."""
+    global _amadeus_token
+    if _amadeus_token and time.monotonic() < _amadeus_token[1]:
+        return _amadeus_token[0]
+
+    async with _loop_state().token_lock:
+        # Another caller may have refreshed it while we waited
+        if _amadeus_token and time.monotonic() < _amadeus_token[1]:
+            return _amadeus_token[0]
+        _amadeus_token = await _fetch_amadeus_token()
+        return _amadeus_token[0]
+
+async def _fetch_amadeus_token() -> tuple[str, float]:
+    settings = get_settings()
+    response = await _provider_request(
+        "amadeus", "POST",
+        f"{AMADEUS_BASE_URLS[settings.AMADEUS_HOSTNAME]}/v1/security/oauth2/token",
+        data={
+            "grant_type": "client_credentials",
+            "client_id": settings.AMADEUS_CLIENT_ID,
+            "client_secret": settings.AMADEUS_CLIENT_SECRET,
+        },
     )
-except Exception as e:
-    logger.error(f"Failed to initialize Amadeus client: {e}")
-    amadeus = None
+    token_data = orjson.loads(response.content)
+    return token_data["access_token"], time.monotonic() + token_data.get("expires_in", 1799) - 60
+
+async def _amadeus_get(path: str, params: dict) -> dict:
+    """
+    Authorized GET against the Amadeus API, returning the parsed body.
+    A 401 (token revoked or expired early) drops the cached token and retries once.
+    """
+    global _amadeus_token
+    url = f"{AMADEUS_BASE_URLS[get_settings().AMADEUS_HOSTNAME]}{path}"
+    for attempt in range(2):
+        token = await _amadeus_access_token()
+        try:
+            response = await _provider_request("amadeus", "GET", url, params=params, headers={"Authorization": f"Bearer {token}"})
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 401 or attempt:
+                raise
+            if _amadeus_token and _amadeus_token[0] == token:
+                _amadeus_token = None
+            continue
+        return orjson.loads(response.content)
 
 # Common City Code Mapping (Simple Fallback)
-CITY_MAP = {
+# Keys may be written in any case; CITY_MAP below holds them normalized.
+_RAW_CITY_MAP = {
     # Japan
     "東京": "TYO", "TOKYO": "TYO", "TYO": "TYO", "羽田": "HND", "HANEDA": "HND", "HND": "HND", "成田": "NRT", "NARITA": "NRT", "NRT": "NRT",
     "大阪": "OSA", "OSAKA": "OSA", "OSA": "OSA", "関西": "KIX", "KIX": "KIX", "ITAMI": "ITM", "伊丹": "ITM", "ITM": "ITM",
@@ -35,163 +163,265 @@ CITY_MAP = {
     "HONOLULU": "HNL", "ホノルル": "HNL"
 }
 
-# Runtime Cache for looked up cities
-DYNAMIC_CITY_CACHE = {}
+# Normalized once at import, the same way resolve_codes() normalizes its input.
+# Read-only; codes are interned like the ones normalize_offers produces.
+CITY_MAP = MappingProxyType({k.strip().upper(): sys.intern(v) for k, v in _RAW_CITY_MAP.items()})
+
+# Finds every known name inside free text ("東京 羽田", "TO TOKYO") in one scan.
+# At a given position the longest name wins; Latin names must be whole words so
+# "KIX" or "OSA" don't match inside unrelated words. Kanji/kana names have no
+# spaces around them, so they match anywhere.
+_CITY_PATTERN = re.compile("|".join(
+    rf"\b{re.escape(name)}\b" if name.isascii() else re.escape(name)
+    for name in sorted(CITY_MAP, key=len, reverse=True)
+))
 
-def resolve_code(input_str: str) -> str:
+# Metropolitan-area codes; a named airport is more specific than these
+_METRO_CODES = frozenset({"TYO", "OSA", "SPK", "NYC", "LON", "PAR"})
+
+def _find_city_in_text(clean_str: str) -> str | None:
     """
-    Convert user input to IATA Code.
-    1. Check Static Map
-    2. Check Cache
-    3. Call Amadeus Location Search
+    IATA code of the most specific known name mentioned in clean_str:
+    the longest match, with airports beating their metro area on ties
+    ("TOKYO NARITA" -> NRT, "東京 羽田" -> HND).
     """
-    if not input_str:
-        return ""
-    
-    clean_str = input_str.strip().upper()
-    
-    # 1. Static Map
-    if clean_str in CITY_MAP:
-        return CITY_MAP[clean_str]
-    
-    # 2. Dynamic Cache
-    if clean_str in DYNAMIC_CITY_CACHE:
-        return DYNAMIC_CITY_CACHE[clean_str]
+    best = max(
+        _CITY_PATTERN.finditer(clean_str),
+        key=lambda m: (len(m.group()), CITY_MAP[m.group()] not in _METRO_CODES),
+        default=None,
+    )
+    return CITY_MAP[best.group()] if best else None
 
-    # 3. Amadeus Location Search (Fallback)
-    if amadeus:
-        try:
-            logger.info(f"Resolving unknown city code via API: {clean_str}")
-            # Import Location here to avoid circular/early import issues if any
-            from amadeus import Location
-            
-            response = amadeus.reference_data.locations.get(
-                keyword=clean_str,
-                subType=[Location.CITY, Location.AIRPORT]
-            )
-            
-            if response.data:
-                # Take the first result's IATA code
-                found_code = response.data[0]['iataCode']
-                logger.info(f"Resolved {clean_str} -> {found_code}")
-                DYNAMIC_CITY_CACHE[clean_str] = found_code
-                return found_code
-                
-        except Exception as e:
-            logger.warning(f"Failed to resolve city via API: {e}")
-            
-    # Fallback: Assume it is a code
-    return clean_str
+# Amadeus Location Search results: normalized input -> IATA code (bounded)
+DYNAMIC_CITY_CACHE = SimpleCache(maxsize=4096)
+LOCATION_CACHE_TTL = 30 * 24 * 3600
+# Inputs Amadeus had no match for (typos, junk), so they aren't re-sent. Kept
+# apart from DYNAMIC_CITY_CACHE so a flood of junk can't evict real codes;
+# entries expire so newly listed locations are still picked up.
+UNKNOWN_LOCATIONS = SimpleCache(maxsize=4096)
+LOCATION_MISS_TTL = 3600
+# Location Search subType filter (cities and airports)
+_LOCATION_SUBTYPES = "CITY,AIRPORT"
+
+async def _lookup_location(keyword: str) -> str | None:
+    """
+    Amadeus Location Search for an unknown city/airport name.
+    Returns the first result's IATA code, or None if there is no match.
+    """
+    logger.info("Resolving unknown city code via API: %s", keyword)
+    data = (await _amadeus_get("/v1/reference-data/locations", {"keyword": keyword, "subType": _LOCATION_SUBTYPES})).get("data")
+    if data:
+        # Take the first result's IATA code
+        found_code = data[0]['iataCode']
+        logger.info("Resolved %s -> %s", keyword, found_code)
+        return found_code
+    return None
 
-def search_offers(origin: str, dest: str, date: str, adults: int = 1, search_mode: str = "api", trip_type: str = "oneway", time_range: str = None, flexible_ticket: bool = False) -> tuple[list[dict], str | None]:
+async def _lookup_and_cache(keyword: str) -> str | None:
+    """_lookup_location, storing the outcome in DYNAMIC_CITY_CACHE / UNKNOWN_LOCATIONS."""
+    found_code = await _lookup_location(keyword)
+    # A failure raises before this point and is not cached: it is retried next time
+    if found_code:
+        DYNAMIC_CITY_CACHE.set(keyword, found_code, ttl_seconds=LOCATION_CACHE_TTL)
+    else:
+        UNKNOWN_LOCATIONS.set(keyword, True, ttl_seconds=LOCATION_MISS_TTL)
+    return found_code
+
+def _shared_lookup(keyword: str) -> asyncio.Future:
+    """Join the in-flight lookup for keyword, starting one if there is none."""
+    inflight = _loop_state().inflight_lookups
+    task = inflight.get(keyword)
+    if task is None:
+        task = asyncio.ensure_future(_lookup_and_cache(keyword))
+        inflight[keyword] = task
+        task.add_done_callback(lambda _: inflight.pop(keyword, None))
+    # Shielded: a cancelled request must not cancel the lookup other requests wait on
+    return asyncio.shield(task)
+
+def _looks_like_iata(code: str) -> bool:
+    """Three ASCII capital letters, e.g. "HND"."""
+    return len(code) == 3 and code.isascii() and code.isalpha() and code.isupper()
+
+async def resolve_codes(*inputs: str) -> list[str]:
+    """
+    Convert user inputs (city names, airport names or codes) to IATA Codes.
+    1. Already an IATA code / Static Map / earlier API results / a known
+       name within the input (no I/O)
+    2. Amadeus Location Search for the rest, all in parallel
+    Inputs that can't be resolved are returned normalized, assuming they are codes.
+    """
+    codes = []
+    misses = set()
+    for input_str in inputs:
+        if not input_str:
+            codes.append("")
+            continue
+        # Fast path: already an IATA code (e.g. "SFO") with no curated mapping;
+        # CITY_MAP keys go through the map below so an alias (e.g. "NRT" -> "TYO") wins
+        if _looks_like_iata(input_str) and input_str not in CITY_MAP:
+            codes.append(input_str)
+            continue
+        clean_str = input_str.strip().upper()
+        code = CITY_MAP.get(clean_str)
+        if code is None:
+            code = DYNAMIC_CITY_CACHE.get(clean_str)
+        if code is None and UNKNOWN_LOCATIONS.get(clean_str):
+            code = clean_str  # Known miss: use the input as is
+        if code is None and _looks_like_iata(clean_str):
+            # A code written in lower case or with spaces ("sfo "): no lookup needed
+            code = clean_str
+        if code is None:
+            code = _find_city_in_text(clean_str)
+        if code is None:
+            misses.add(clean_str)
+        codes.append(code or clean_str)
+
+    if misses and get_settings().AMADEUS_CLIENT_ID:
+        keywords = list(misses)
+        found = await asyncio.gather(*map(_shared_lookup, keywords), return_exceptions=True)
+        resolved = {}
+        for keyword, found_code in zip(keywords, found):
+            if isinstance(found_code, Exception):
+                logger.warning("Failed to resolve city via API: %s", found_code)
+            elif found_code:
+                resolved[keyword] = found_code
+        codes = [resolved.get(code, code) for code in codes]
+
+    return codes
+
+async def resolve_code(input_str: str) -> str:
+    """Convert a single user input to an IATA Code (see resolve_codes)."""
+    return (await resolve_codes(input_str))[0]
+
+def _tag_source(offers: list[dict], source: str) -> list[dict]:
+    """
+    Mark raw offers with their provider (read by normalize_offers), in place.
+    The tagged list is then added to the results with one C-level list.extend.
+    """
+    for offer in offers:
+        offer['_source'] = source
+    return offers
+
+async def _serpapi_fetch(origin_code: str, dest_code: str, date: str, adults: int, trip_type: str, non_stop: bool) -> list[dict]:
+    """Google Flights (SerpApi): 'best_flights' followed by 'other_flights'."""
+    logger.info("[API MODE] Searching SerpApi (Google Flights)...")
+    params = {
+        "engine": "google_flights",
+        "departure_id": origin_code,
+        "arrival_id": dest_code,
+        "outbound_date": date,
+        "adults": adults,
+        "currency": "JPY", # Enforce JPY
+        "hl": "ja",        # Japanese locale
+        "api_key": get_settings().SERPAPI_KEY,
+        "output": "json",
+        # Only the flight lists are read; SerpApi drops the rest (price_insights,
+        # airports, search metadata...) server-side, shrinking transfer and parse
+        "json_restrictor": "best_flights,other_flights",
+        "type": "2" if trip_type == "oneway" else "1" # 2=OneWay, 1=RoundTrip
+    }
+    if non_stop:
+        params["stops"] = "1"  # Nonstop only
+    # Round trips would need a return date, which the current signature doesn't take yet
+
+    response = await _provider_request("serpapi", "GET", SERPAPI_URL, params=params)
+    serpapi_data = orjson.loads(response.content)
+
+    # Google Flights API structure usually has 'best_flights' and 'other_flights'
+    flight_lists = serpapi_data.get("best_flights", []) + serpapi_data.get("other_flights", [])
+    if not flight_lists:
+        logger.warning("[API MODE] SerpApi returned 0 flights.")
+    _tag_source(flight_lists, 'serpapi')
+    logger.info("[API MODE] SerpApi found %d offers", len(flight_lists))
+    return flight_lists
+
+async def _amadeus_fetch(origin_code: str, dest_code: str, date: str, adults: int, max_results: int, non_stop: bool) -> list[dict]:
+    """Amadeus Flight Offers Search (v2), limited to max_results offers server-side."""
+    logger.info("[API MODE] Searching Amadeus API...")
+    amadeus_offers = (await _amadeus_get("/v2/shopping/flight-offers", {
+        "originLocationCode": origin_code,
+        "destinationLocationCode": dest_code,
+        "departureDate": date,
+        "adults": adults,
+        "currencyCode": "JPY",
+        "max": max_results,
+        "nonStop": "true" if non_stop else "false"
+    })).get("data", [])
+    _tag_source(amadeus_offers, 'amadeus')
+    logger.info("[API MODE] Amadeus found %d offers", len(amadeus_offers))
+    return amadeus_offers
+
+async def search_offers(origin: str, dest: str, date: str, adults: int = 1, search_mode: str = "api", trip_type: str = "oneway", time_range: str = None, flexible_ticket: bool = False, max_results: int = 50, non_stop: bool = False) -> tuple[list[dict], str | None]:
     """
     Orchestrate the search process.
+    max_results caps what is requested from Amadeus (the caller only shows that many);
+    non_stop asks the APIs for direct flights only.
+    In API mode all enabled providers are queried concurrently; a failing provider
+    is logged and the others' offers are still returned.
     """
-    logger.info(f"Searching offers: {origin}->{dest} on {date} (Mode: {search_mode})")
+    logger.info("Searching offers: %s->%s on %s (Mode: %s)", origin, dest, date, search_mode)
     
     
-    # Resolve cities to airport codes using comprehensive mapping
-    origin_code = resolve_code(origin)
-    dest_code = resolve_code(dest)
+    # Resolve cities to airport codes using comprehensive mapping (one round of lookups for both)
+    origin_code, dest_code = await resolve_codes(origin, dest)
 
     
     # 1. Scraper Mode (ANA Official)
     if search_mode == "scraper":
-        logger.info(f"[SCRAPER MODE] Using ANA Official scraper: {origin}({origin_code})->{dest}({dest_code}) on {date}, trip_type={trip_type}")
+        logger.info("[SCRAPER MODE] Using ANA Official scraper: %s(%s)->%s(%s) on %s, trip_type=%s", origin, origin_code, dest, dest_code, date, trip_type)
         results = []
         warning = None
         try:
-            from app.skills.scrape_ana import scrape_ana_flights
+            from app.skills.scrape_ana import scrape_ana_flights_async
             # Pass new filters to scraper
-            ana_results, ana_warning = scrape_ana_flights(
-                origin_code, dest_code, date, adults, 
+            ana_results, ana_warning = await scrape_ana_flights_async(
+                origin_code, dest_code, date, adults=adults,
                 trip_type=trip_type,
                 time_range=time_range, 
                 flexible_ticket=flexible_ticket
             )
             results.extend(ana_results)
             warning = ana_warning
-            logger.info(f"[SCRAPER MODE] ANA scraper found {len(ana_results)} offers")
+            logger.info("[SCRAPER MODE] ANA scraper found %d offers", len(ana_results))
         except Exception as e:
-            logger.error(f"[SCRAPER MODE] ANA scraper failed: {e}")
+            logger.error("[SCRAPER MODE] ANA scraper failed: %s", e)
             warning = f"ANA Scraper Failed: {e}"
         
-        return results, warning
-  # Return scraper results and warning
+        return results, warning  # Return scraper results and warning
     
-    # Mode: API - Use Google Flights (SerpApi) as primary
-    logger.info(f"[API MODE] Using API search: {origin}({origin_code})->{dest}({dest_code}) on {date}")
+    # Mode: API - Google Flights (SerpApi), plus Amadeus when enabled
+    logger.info("[API MODE] Using API search: %s(%s)->%s(%s) on %s", origin, origin_code, dest, dest_code, date)
     results = [] # Initialize results list
 
-    
-    # 1. Try SerpApi (Google Flights) - PRIMARY
+    settings = get_settings()
+    providers = {}
     if settings.SERPAPI_KEY:
-        try:
-            logger.info(f"[API MODE] Searching SerpApi (Google Flights)...")
-            params = {
-                "engine": "google_flights",
-                "departure_id": origin_code,
-                "arrival_id": dest_code,
-                "outbound_date": date,
-                "adults": adults,
-                "currency": "JPY", # Enforce JPY
-                "hl": "ja",        # Japanese locale
-                "api_key": settings.SERPAPI_KEY,
-                "type": "2" if trip_type == "oneway" else "1" # 2=OneWay, 1=RoundTrip
-            }
-            
-            if trip_type == "roundtrip":
-                 # Add return date if needed, but current signature doesn't support it fully yet
-                 # For now defaulting to one-way logic or simple parameter pass key
-                 pass
-            
-            search = GoogleSearch(params)
-            serpapi_data = search.get_dict()
-            
-            # Extract 'best_flights' or 'flights'
-            # Google Flights API structure usually has 'best_flights' and 'other_flights'
-            flight_lists = []
-            if "best_flights" in serpapi_data:
-                flight_lists.extend(serpapi_data["best_flights"])
-            if "other_flights" in serpapi_data:
-                flight_lists.extend(serpapi_data["other_flights"])
-                
-            if not flight_lists:
-                logger.warning(f"[API MODE] SerpApi returned 0 flights.")
-            
-            for flight in flight_lists:
-                flight['_source'] = 'serpapi'
-                results.append(flight)
-                
-            logger.info(f"[API MODE] SerpApi found {len(results)} offers")
-            
-        except Exception as e:
-            logger.error(f"[API MODE] SerpApi Error: {e}")
-            
-    # 2. Amadeus (Legacy/Backup - Disabled for now as per request)
-    """
-    if not results and amadeus:
-        try:
-            logger.info(f"[API MODE] Searching Amadeus API (Backup)...")
-            response = amadeus.shopping.flight_offers_search.get(
-                originLocationCode=origin_code,
-                destinationLocationCode=dest_code,
-                departureDate=date,
-                adults=adults,
-                currencyCode="JPY",
-                max=50
-            )
-            if response.data:
-                amadeus_offers = response.data
-                for offer in amadeus_offers:
-                    offer['_source'] = 'amadeus'
-                results.extend(amadeus_offers)
-                logger.info(f"[API MODE] Amadeus found {len(amadeus_offers)} offers")
-        except ResponseError as e:
-            logger.error(f"[API MODE] Amadeus API Error: {e.code}")
-        except Exception as e:
-            logger.error(f"[API MODE] Amadeus Unexpected Error: {e}")
-    """
+        providers["SerpApi"] = _serpapi_fetch(origin_code, dest_code, date, adults, trip_type, non_stop)
+    if settings.AMADEUS_SEARCH_ENABLED and settings.AMADEUS_CLIENT_ID:
+        providers["Amadeus"] = _amadeus_fetch(origin_code, dest_code, date, adults, max_results, non_stop)
+
+    outcomes = await asyncio.gather(*providers.values(), return_exceptions=True)
+    for name, outcome in zip(providers, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("[API MODE] %s Error: %s", name, outcome)
+        else:
+            results.extend(outcome)
     
-    logger.info(f"[API MODE] Total API results: {len(results)}")
+    logger.info("[API MODE] Total API results: %d", len(results))
     return results, None
+
+# Concurrent searches per batch (keeps within SerpApi's rate limits)
+BATCH_MAX_CONCURRENCY = 8
+
+async def search_offers_batch(queries: list[dict]) -> list[tuple[list[dict], str | None]]:
+    """
+    Run several searches (e.g. multiple dates or city pairs) concurrently.
+    Each query is a dict of search_offers() keyword arguments; results keep query order.
+    """
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run(query: dict):
+        async with semaphore:
+            return await search_offers(**query)
+
+    return await asyncio.gather(*map(run, queries))
@@ -0,0 +1,26 @@
+"""
+Shared fixtures for the scraper tests.
+The tests drive the real sites through Playwright, so they only run with
+RUN_LIVE_SCRAPER_TESTS=1. They can run in parallel with `pytest -n auto`
+(pytest-xdist); each worker launches its browsers once and reuses them.
+"""
+import os
+
+import pytest
+
+from app.core.browser import get_browser_pool
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("RUN_LIVE_SCRAPER_TESTS") == "1":
+        return
+    skip_live = pytest.mark.skip(reason="live scraper test (set RUN_LIVE_SCRAPER_TESTS=1 to run)")
+    for item in items:
+        if "browser_pool" in item.fixturenames:
+            item.add_marker(skip_live)
+
+@pytest.fixture(scope="session")
+def browser_pool():
+    """The scrapers' browser pool, warm for the whole session and closed at the end."""
+    pool = get_browser_pool()
+    yield pool
+    pool.close()
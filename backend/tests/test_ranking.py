@@ -0,0 +1,45 @@
+"""
+Test offer scoring and ranking
+"""
+import pytest
+
+from app.core.ranking import BASE_SCORE, calculate_score, rank_offers, score_breakdown
+from app.models import Offer
+
+def _offer(offer_id, price, minutes, stops=0, carrier="NH"):
+    return Offer(
+        id=offer_id, source="amadeus", price=price, currency="JPY",
+        total_duration_minutes=minutes, segments=[], carrier_main=carrier, stops=stops,
+    )
+
+def _offers():
+    return [
+        _offer("a", 30000, 90),
+        _offer("b", 12000, 80),
+        _offer("c", 25000, 300, stops=1),
+        _offer("d", 28000, 95, carrier="JL"),
+        _offer("e", 9000, 240, stops=2),
+    ]
+
+@pytest.mark.parametrize("prefs", [None, {"carrier": "JL"}])
+@pytest.mark.parametrize("top_k", [None, 0, 2, 5, 10])
+def test_rank_offers_matches_full_sort(prefs, top_k):
+    offers = _offers()
+    expected = sorted(offers, key=lambda o: calculate_score(o, prefs), reverse=True)
+    if top_k is not None:
+        expected = expected[:top_k]
+
+    ranked = rank_offers(offers, prefs, top_k=top_k)
+
+    assert [o.id for o in ranked] == [o.id for o in expected]
+    assert all(o.score == calculate_score(o, prefs) for o in ranked)
+
+@pytest.mark.parametrize("prefs", [None, {"carrier": "NH"}])
+def test_score_breakdown_sums_to_score(prefs):
+    for offer in _offers():
+        score = calculate_score(offer, prefs)
+        breakdown = score_breakdown(offer, prefs)
+
+        points = sum(float(value.split(" ", 1)[0]) for value in breakdown.values())
+        assert points == pytest.approx(score - BASE_SCORE, abs=0.05 * len(breakdown))
+        assert ("carrier" in breakdown) == (prefs is not None and offer.carrier_main == "NH")
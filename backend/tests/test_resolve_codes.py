@@ -0,0 +1,22 @@
+"""
+Test city/airport name resolution
+"""
+import asyncio
+
+import pytest
+
+from app.skills.search_offers import _find_city_in_text, resolve_codes
+
+@pytest.mark.parametrize("text,code", [
+    ("TOKYO NARITA", "NRT"),
+    ("東京 羽田", "HND"),
+    ("東京羽田", "HND"),
+    ("FLY TO TOKYO", "TYO"),
+    ("NEW YORK CITY", "NYC"),
+    ("KIXX", None),
+])
+def test_find_city_in_text(text, code):
+    assert _find_city_in_text(text) == code
+
+def test_resolve_codes_prefers_airport():
+    assert asyncio.run(resolve_codes("Tokyo Narita", "東京 羽田", "osaka")) == ["NRT", "HND", "OSA"]
@@ -0,0 +1,26 @@
+"""
+Test ENA Travel scraper
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from app.skills.scrape_ena import scrape_ena_flights
+
+def _days_ahead(days):
+    """A departure date that stays in the future whenever the test runs."""
+    return (date.today() + timedelta(days=days)).isoformat()
+
+@pytest.mark.usefixtures("browser_pool")
+@pytest.mark.parametrize("headless,origin,dest,depart", [
+    (True, "TYO", "HIJ", _days_ahead(30)),
+    (False, "TYO", "OSA", _days_ahead(44)),  # visible browser
+])
+def test_scrape_ena_flights(headless, origin, dest, depart):
+    results, warning = scrape_ena_flights(origin, dest, depart, 1, headless=headless)
+
+    assert results, warning or "No results returned - check error logs"
+    for offer in results:
+        assert offer["id"]
+        assert offer["itineraries"][0]["segments"][0]["departure"]["at"].startswith(f"{depart}T")
+        assert float(offer["price"]["total"]) > 0
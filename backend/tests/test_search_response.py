@@ -0,0 +1,38 @@
+"""
+Test the /search response envelope and its offer cache
+"""
+import orjson
+import pytest
+
+from app.core.cache import SimpleCache
+from app.main import _search_response
+
+@pytest.mark.parametrize("offers", [[], [{"id": "1", "price": 12000.0}, {"id": "2", "price": 9800.0}]])
+@pytest.mark.parametrize("meta", [{}, {"latency_seconds": 0.42, "cached": True, "warning": None}])
+def test_search_response_is_valid_json(offers, meta):
+    response = _search_response(orjson.dumps(offers), **meta)
+
+    assert response.media_type == "application/json"
+    assert orjson.loads(response.body) == {"offers": offers, **meta}
+
+def test_cache_evicts_expired_entries_first():
+    cache = SimpleCache(maxsize=3, shards=1)
+    cache.set("old", 1)
+    cache.set("stale", 2, ttl_seconds=-1)
+    cache.set("new", 3)
+
+    cache.set("newest", 4)
+
+    assert cache.get("stale") is None
+    assert [cache.get(k) for k in ("old", "new", "newest")] == [1, 3, 4]
+
+def test_cache_evicts_oldest_when_none_expired():
+    cache = SimpleCache(maxsize=3, shards=1)
+    for i, key in enumerate(("a", "b", "c")):
+        cache.set(key, i)
+
+    cache.set("d", 3)
+    cache.set("b", 10)  # overwriting a present key never evicts
+
+    assert cache.get("a") is None
+    assert [cache.get(k) for k in ("b", "c", "d")] == [10, 2, 3]